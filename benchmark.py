@@ -0,0 +1,163 @@
+# coding=utf-8
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from statistics import median
+
+from level import Level
+from solve import add_stage_arguments, methods, parse_stages, stage_number
+from solver import Solver
+
+# bump when the record fields change, compare() refuses baselines of another version
+version = 1
+fields = [
+	'version', 'stage', 'method', 'length', 'states', 'runs',
+	'min_ms', 'median_ms', 'p90_ms', 'p99_ms', 'max_ms', 'peak_kb'
+]
+
+
+def percentile(values, q: float):
+	# linear interpolation between the closest ranks
+	values = sorted(values)
+	position = (len(values) - 1) * q
+	lower = int(position)
+	upper = min(lower + 1, len(values) - 1)
+	return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def measure(level: Level, method: int, repeat=5, warmup=1):
+	for _ in range(warmup):
+		Solver.run(level, method)
+
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter_ns()
+		path, states = Solver.run(level, method)
+		times.append(time.perf_counter_ns() - start)
+
+	# tracing slows the solver down, so peak memory gets a run of its own
+	tracemalloc.start()
+	Solver.run(level, method)
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	times = [value / 1e6 for value in times]
+	return {
+		'length': len(path) if path is not None else None,
+		'states': states,
+		'runs': repeat,
+		'min_ms': round(min(times), 4),
+		'median_ms': round(median(times), 4),
+		'p90_ms': round(percentile(times, 0.9), 4),
+		'p99_ms': round(percentile(times, 0.99), 4),
+		'max_ms': round(max(times), 4),
+		'peak_kb': round(peak / 1024, 3),
+	}
+
+
+def run(paths, method_names, repeat=5, warmup=1):
+	records = []
+	for path in paths:
+		level = Level.load(path)
+		for name in method_names:
+			record = {'version': version, 'stage': stage_number(path), 'method': name}
+			record.update(measure(level, methods[name], repeat, warmup))
+			records.append(record)
+			print('stage {stage:>3} {method:<22} median {median_ms:>10.3f} ms  p90 {p90_ms:>10.3f} ms  '
+				  'peak {peak_kb:>10.1f} KB'.format(**record), file=sys.stderr)
+	return records
+
+
+def get_metadata():
+	return {
+		'version': version,
+		'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'processor': platform.processor() or platform.machine(),
+		'cpu_count': os.cpu_count(),
+	}
+
+
+def write(records, path: str):
+	if path.endswith('.csv'):
+		with open(path, 'w', newline='') as file:
+			writer = csv.DictWriter(file, fieldnames=fields)
+			writer.writeheader()
+			writer.writerows(records)
+	else:
+		with open(path, 'w') as file:
+			json.dump({'metadata': get_metadata(), 'results': records}, file, indent=1)
+
+
+def read(path: str):
+	if path.endswith('.csv'):
+		with open(path, newline='') as file:
+			records = []
+			for row in csv.DictReader(file):
+				record = {'method': row['method']}
+				for field in fields:
+					if field not in record:
+						record[field] = json.loads(row[field]) if row[field] else None
+				records.append(record)
+			return records
+	with open(path) as file:
+		return json.load(file)['results']
+
+
+def compare(records, baseline, threshold=0.1):
+	# returns a line per regression: slower median, more peak memory or a different solution length
+	previous = {(record['stage'], record['method']): record for record in baseline}
+	regressions = []
+	for record in records:
+		key = (record['stage'], record['method'])
+		if key not in previous:
+			continue
+		old = previous[key]
+		if old['version'] != record['version']:
+			raise ValueError('baseline version {} does not match {}'.format(old['version'], record['version']))
+
+		name = 'stage {} {}'.format(*key)
+		if record['length'] != old['length']:
+			regressions.append('{}: length {} -> {}'.format(name, old['length'], record['length']))
+		for field in ('median_ms', 'peak_kb'):
+			if old[field] and record[field] > old[field] * (1 + threshold):
+				regressions.append('{}: {} {} -> {} (+{:.1%})'.format(
+						name, field, old[field], record[field], record[field] / old[field] - 1))
+	return regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the solvers per stage and per method.')
+	add_stage_arguments(parser)
+	parser.add_argument('-m', '--method', action='append', choices=sorted(methods), help='default: all')
+	parser.add_argument('-r', '--repeat', type=int, default=5, help='timed runs per stage and method')
+	parser.add_argument('-w', '--warmup', type=int, default=1, help='untimed runs before timing')
+	parser.add_argument('-o', '--output', help='write the results to a .json or .csv file')
+	parser.add_argument('-c', '--compare', help='baseline results file to check for regressions')
+	parser.add_argument('-t', '--threshold', type=float, default=0.1, help='allowed slowdown, 0.1 is 10%%')
+	args = parser.parse_args(argv)
+
+	paths = parse_stages(parser, args)
+
+	records = run(paths, args.method or sorted(methods), args.repeat, args.warmup)
+	if args.output:
+		write(records, args.output)
+
+	if args.compare:
+		regressions = compare(records, read(args.compare), args.threshold)
+		for line in regressions:
+			print('REGRESSION ' + line)
+		if regressions:
+			sys.exit(1)
+		print('no regressions against {}'.format(args.compare))
+
+
+if __name__ == '__main__':
+	main()
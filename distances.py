@@ -0,0 +1,53 @@
+# coding=utf-8
+from array import array
+
+from level import Level
+
+
+class Distances:
+	# Number of moves left to the goal from every state of a level, by a breadth-first search backwards
+	# from the goal over the whole (config, bridge mask) space, -1 where the goal can't be reached.
+	# Built once per level (Distances.of), after which the moves left and the best next move from any
+	# state are table lookups. It is also a perfect heuristic for Solver.informed_search.
+
+	def __init__(self, level: Level):
+		self.level = level
+		self.table = array('i', [-1]) * level.get_size()
+		layer = level.get_goals()
+		for key in layer:
+			self.table[key] = 0
+
+		depth = 0
+		while layer:
+			depth += 1
+			next_layer = []
+			for key in layer:
+				for _, previous in level.preimages(key):
+					if self.table[previous] < 0:
+						self.table[previous] = depth
+						next_layer.append(previous)
+			layer = next_layer
+
+	@staticmethod
+	def of(level: Level):
+		if level.distances is None:
+			level.distances = Distances(level)
+		return level.distances
+
+	def get_distance(self, key: int):
+		return self.table[key]
+
+	def get_hint(self, key: int):
+		# an action on a shortest path to the goal, None on the goal or when it can't be reached
+		distance = self.table[key]
+		if distance <= 0:
+			return None
+		for action, child in self.level.successors(key):
+			if self.table[child] == distance - 1:
+				return action
+		return None
+
+	def estimate(self, x0: int, y0: int, x1: int, y1: int, mask: int):
+		# same interface as solver.Heuristic
+		distance = self.table[self.level.encode(x0, y0, x1, y1, mask)]
+		return distance if distance >= 0 else float('inf')
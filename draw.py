@@ -1,11 +1,17 @@
 # coding=utf-8
 from math import cos, pi, sin
-from typing import Tuple
+from typing import Callable, Tuple
 
 import numpy as np
-from OpenGL.GL import glBegin, glColor, glEnd, glTranslate
-from OpenGL.raw.GL.VERSION.GL_1_0 import glLineWidth, glPopMatrix, glPushMatrix, glVertex3f
-from OpenGL.raw.GL.VERSION.GL_1_1 import GL_LINES, GL_POLYGON, GL_QUAD_STRIP
+from OpenGL.GL import GL_COMPILE, GL_FLOAT, GL_VERTEX_ARRAY, glBegin, glCallList, glColor, glDeleteLists, \
+	glDisableClientState, glDrawArrays, glEnableClientState, glEnd, glEndList, glGenLists, glNewList, glTranslate, \
+	glVertexPointer
+from OpenGL.raw.GL.VERSION.GL_1_0 import glBlendFunc, glClearColor, glEnable, glHint, glLineWidth, glPopMatrix, \
+	glPushMatrix, glRotatef, glTranslatef, glVertex3f
+from OpenGL.raw.GL.VERSION.GL_1_1 import GL_BLEND, GL_DEPTH_TEST, GL_LINE_SMOOTH, GL_LINE_SMOOTH_HINT, GL_LINES, \
+	GL_NICEST, GL_ONE_MINUS_SRC_ALPHA, GL_POLYGON, GL_POLYGON_SMOOTH, GL_POLYGON_SMOOTH_HINT, GL_QUAD_STRIP, \
+	GL_SRC_ALPHA
+from OpenGL.raw.GLU import gluLookAt, gluPerspective
 
 
 class Draw:
@@ -57,8 +63,51 @@ class Draw:
 	}
 	# @formatter:on
 
-	torus_pt = []
-	x_switch_pt = []
+	# angle step (radians) used to tessellate the round switches and teleporters, smaller is smoother
+	angle_stepsize = 0.1
+	# shape name -> [(GL mode, uses the switch color, float32 vertices)], filled by get_mesh
+	meshes = {}
+
+	@staticmethod
+	def setup_view(size: Tuple[int, int], offset: Tuple[int, int]):
+		# camera and GL state for a board of offset = (width, height) tiles, on the current context
+		width, height = offset
+		ratio = (width ** 2 + height ** 2) / 325
+		glClearColor(0.83137254902, 0.83137254902, 0.83137254902, 1)
+		gluPerspective(60, (size[0] / size[1]), 0.1, 1000.0)
+		gluLookAt(0.0, 0.0, 3.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+		gluLookAt(4 * ratio, 4 * ratio, 8 * ratio, 0, 0, 0, 0, 0, 1)
+
+		glRotatef(135, 0, 0, 1)
+		glRotatef(5, 0, 0, 1)
+		glTranslatef(-width / 2, height / 2 + 1, 0)
+		glEnable(GL_DEPTH_TEST)
+		glEnable(GL_LINE_SMOOTH)
+		glEnable(GL_POLYGON_SMOOTH)
+		glHint(GL_LINE_SMOOTH_HINT, GL_NICEST)
+		glHint(GL_POLYGON_SMOOTH_HINT, GL_NICEST)
+		glEnable(GL_BLEND)
+		glLineWidth(1)
+		glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+	@staticmethod
+	def compile(draw: Callable[[], None], display_list=0):
+		# record the GL calls made by draw() into a display list (a new one, or over the given one)
+		# so that replaying them costs a single glCallList
+		if not display_list:
+			display_list = glGenLists(1)
+		glNewList(display_list, GL_COMPILE)
+		draw()
+		glEndList()
+		return display_list
+
+	@staticmethod
+	def call(display_list: int):
+		glCallList(display_list)
+
+	@staticmethod
+	def delete(display_list: int):
+		glDeleteLists(display_list, 1)
 
 	@staticmethod
 	def draw_cube(
@@ -101,186 +150,118 @@ class Draw:
 		glEnd()
 
 	@staticmethod
-	def draw_teleport_switch(position: Tuple[int, int], color: Tuple[float, float, float]):
-		radius = 0.4
-		height = 0.15
-		angle_stepsize = 0.1
+	def set_quality(angle_stepsize: float):
+		Draw.angle_stepsize = angle_stepsize
+		Draw.meshes.clear()
 
-		glPushMatrix()
-		glTranslate(0.5 + position[0], -0.5 - position[1], 0)
-		glColor(color)
-
-		# side 1
-		glBegin(GL_QUAD_STRIP)
+	@staticmethod
+	def get_angles():
+		# the angles 0, step, 2 * step... below 2 * pi, accumulated the way the original loops did
+		angles = []
 		angle = 0.0
-		first = True
-		temp_x, temp_y = 0, 0
 		while angle < 2 * pi:
-			x = radius * cos(angle)
-			y = radius * sin(angle)
-			if y >= 0.1:
-				if first:
-					temp_x, temp_y = x, y
-					first = False
-				glVertex3f(x, y, height)
-				glVertex3f(x, y, 0)
-			angle += angle_stepsize
+			angles.append(angle)
+			angle += Draw.angle_stepsize
+		return angles, angle
 
-		while angle > 0:
-			x = radius * cos(angle)
-			y = radius * sin(angle)
-			if y >= 0.1:
-				glVertex3f(x * 0.6, y * 0.6, height)
-				glVertex3f(x * 0.6, y * 0.6, 0)
-			angle -= angle_stepsize
-		glVertex3f(temp_x, temp_y, height)
-		glVertex3f(temp_x, temp_y, 0)
-		glEnd()
-
-		# side 2
-		glBegin(GL_QUAD_STRIP)
-		angle = 0.0
-		first = True
-		temp_x, temp_y = 0, 0
-		while angle < 2 * pi:
-			x = radius * cos(angle)
-			y = radius * sin(angle)
-			if y <= -0.1:
-				if first:
-					temp_x, temp_y = x, y
-					first = False
-				glVertex3f(x, y, height)
-				glVertex3f(x, y, 0)
-			angle += angle_stepsize
+	@staticmethod
+	def tessellate_teleport_switch(radius=0.4, height=0.15):
+		angles, end = Draw.get_angles()
+		parts = []
+		for upper in (True, False):
+			# an arc of the ring on each side of the x axis
+			def is_inside(y):
+				return y >= 0.1 if upper else y <= -0.1
 
-		while angle > 0:
-			x = radius * cos(angle)
-			y = radius * sin(angle)
-			if y <= -0.1:
-				glVertex3f(x * 0.6, y * 0.6, height)
-				glVertex3f(x * 0.6, y * 0.6, 0)
-			angle -= angle_stepsize
-		glVertex3f(temp_x, temp_y, height)
-		glVertex3f(temp_x, temp_y, 0)
-		glEnd()
+			side = []
+			for angle in angles:
+				x, y = radius * cos(angle), radius * sin(angle)
+				if is_inside(y):
+					side += [(x, y, height), (x, y, 0)]
+			first = side[:2]
+			angle = end
+			while angle > 0:
+				x, y = radius * cos(angle), radius * sin(angle)
+				if is_inside(y):
+					side += [(x * 0.6, y * 0.6, height), (x * 0.6, y * 0.6, 0)]
+				angle -= Draw.angle_stepsize
+			parts.append((GL_QUAD_STRIP, True, side + first))
 
-		# top 1
-		glColor(Draw.colors['gray'])
-		glBegin(GL_QUAD_STRIP)
-		angle = 0.0
-		while angle < 2 * pi:
-			x1 = radius * cos(angle)
-			y1 = radius * sin(angle)
-			x2 = radius * cos(angle) * 0.6
-			y2 = radius * sin(angle) * 0.6
-			if y1 >= 0.1:
-				glVertex3f(x1, y1, height)
-				glVertex3f(x2, y2, height)
-			angle += angle_stepsize
-		glEnd()
+		for upper in (True, False):
+			top = []
+			for angle in angles:
+				x, y = radius * cos(angle), radius * sin(angle)
+				if (y >= 0.1) if upper else (y <= -0.1):
+					top += [(x, y, height), (x * 0.6, y * 0.6, height)]
+			parts.append((GL_QUAD_STRIP, False, top))
+		return parts
 
-		# top 2
-		glColor(Draw.colors['gray'])
-		glBegin(GL_QUAD_STRIP)
-		angle = 0.0
-		while angle < 2 * pi:
-			x1 = radius * cos(angle)
-			y1 = radius * sin(angle)
-			x2 = radius * cos(angle) * 0.6
-			y2 = radius * sin(angle) * 0.6
-			if y1 <= -0.1:
-				glVertex3f(x1, y1, height)
-				glVertex3f(x2, y2, height)
-			angle += angle_stepsize
-		glEnd()
+	@staticmethod
+	def tessellate_round_switch(radius=0.4, height=0.15):
+		angles, _ = Draw.get_angles()
+		side = []
+		top = []
+		for angle in angles:
+			x, y = radius * cos(angle), radius * sin(angle)
+			side += [(x, y, height - 0.01), (x, y, 0.0)]
+			top.append((x, y, height))
+		side += [(radius, 0.0, height - 0.01), (radius, 0.0, 0.0)]
+		top.append((radius, 0.0, height))
+		return [(GL_QUAD_STRIP, True, side), (GL_POLYGON, False, top)]
 
-		glPopMatrix()
+	@staticmethod
+	def tessellate_x_switch(width=0.15, size=0.25, height=0.15):
+		outline = [
+			(-width, 0),
+			(-(width + size), -size),
+			(-(width + size), -(width + size)),
+			(-size, -(width + size)),
+			(0, -width),
+			(size, -(width + size)),
+			(width + size, -(width + size)),
+			(width + size, -size),
+			(width, 0),
+			(width + size, size),
+			(width + size, width + size),
+			(size, width + size),
+			(0, width),
+			(-size, width + size),
+			(-(width + size), width + size),
+			(-(width + size), size)]
+		side = []
+		for x, y in outline + outline[:1]:
+			side += [(x, y, height), (x, y, 0)]
+		return [(GL_QUAD_STRIP, True, side), (GL_POLYGON, False, [(x, y, height) for x, y in outline])]
 
 	@staticmethod
-	def draw_round_switch(position: Tuple[int, int], color: Tuple[float, float, float]):
+	def get_mesh(name: str):
+		# tessellated once per quality setting, centered on the origin of a tile
+		if name not in Draw.meshes:
+			parts = getattr(Draw, 'tessellate_' + name)()
+			Draw.meshes[name] = [
+				(mode, colored, np.array(vertices, dtype=np.float32)) for mode, colored, vertices in parts]
+		return Draw.meshes[name]
 
+	@staticmethod
+	def draw_mesh(name: str, position: Tuple[int, int], color: Tuple[float, float, float]):
 		glPushMatrix()
 		glTranslate(0.5 + position[0], -0.5 - position[1], 0)
-		glColor(color)
-
-		radius = 0.4
-		height = 0.15
-		angle = 0.0
-		angle_stepsize = 0.1
-		# glColor(Cube.colors['light_blue'])
-		glBegin(GL_QUAD_STRIP)
-		while angle < 2 * pi:
-			x = radius * cos(angle)
-			y = radius * sin(angle)
-			glVertex3f(x, y, height - 0.01)
-			glVertex3f(x, y, 0.0)
-			angle += angle_stepsize
-
-		glVertex3f(radius, 0.0, height - 0.01)
-		glVertex3f(radius, 0.0, 0.0)
-		glEnd()
-
-		# glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
-		glLineWidth(3)
-		glColor(Draw.colors['gray'])
-		glBegin(GL_POLYGON)
-		angle = 0.0
-		while angle < 2 * pi:
-			x = radius * cos(angle)
-			y = radius * sin(angle)
-			glVertex3f(x, y, height)
-			angle += angle_stepsize
-		glVertex3f(radius, 0.0, height)
-		glEnd()
-		glLineWidth(1)
-
+		glEnableClientState(GL_VERTEX_ARRAY)
+		for mode, colored, vertices in Draw.get_mesh(name):
+			glColor(color if colored else Draw.colors['gray'])
+			glVertexPointer(3, GL_FLOAT, 0, vertices)
+			glDrawArrays(mode, 0, len(vertices))
+		glDisableClientState(GL_VERTEX_ARRAY)
 		glPopMatrix()
 
 	@staticmethod
-	def draw_x_switch(position: Tuple[int, int], color: Tuple[float, float, float]):
-
-		glPushMatrix()
-		glTranslate(0.5 + position[0], -0.5 - position[1], 0)
-
-		height = 0.15
-		# glColor(Cube.colors['light_blue'])
-		if len(Draw.x_switch_pt) == 0:
-			width = 0.15
-			size = 0.25
-			Draw.x_switch_pt = [
-				(-width, 0),
-				(-(width + size), -size),
-				(-(width + size), -(width + size)),
-				(-size, -(width + size)),
-				(0, -width),
-				(size, -(width + size)),
-				(width + size, -(width + size)),
-				(width + size, -size),
-				(width, 0),
-				(width + size, size),
-				(width + size, width + size),
-				(size, width + size),
-				(0, width),
-				(-size, width + size),
-				(-(width + size), width + size),
-				(-(width + size), size)]
-
-		glColor(color)
-		glBegin(GL_QUAD_STRIP)
-		for x, y in Draw.x_switch_pt:
-			glVertex3f(x, y, height)
-			glVertex3f(x, y, 0)
-		glVertex3f(Draw.x_switch_pt[0][0], Draw.x_switch_pt[0][1], height)
-		glVertex3f(Draw.x_switch_pt[0][0], Draw.x_switch_pt[0][1], 0)
-		glEnd()
+	def draw_teleport_switch(position: Tuple[int, int], color: Tuple[float, float, float]):
+		Draw.draw_mesh('teleport_switch', position, color)
 
-		glLineWidth(3)
-		glColor(Draw.colors['gray'])
-		# -0.2, 0 -> -0.8, 0.6
-		glBegin(GL_POLYGON)
-		for x, y in Draw.x_switch_pt:
-			glVertex3f(x, y, height)
-		glEnd()
-		glLineWidth(1)
+	@staticmethod
+	def draw_round_switch(position: Tuple[int, int], color: Tuple[float, float, float]):
+		Draw.draw_mesh('round_switch', position, color)
 
-		glPopMatrix()
+	@staticmethod
+	def draw_x_switch(position: Tuple[int, int], color: Tuple[float, float, float]):
+		Draw.draw_mesh('x_switch', position, color)
@@ -0,0 +1,182 @@
+# coding=utf-8
+import argparse
+import json
+import os
+import random
+import time
+
+from graph import StateGraph
+from level import Level, parse_level
+from solver import Solver
+from utility import Method, Tile
+
+generated_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Generated')
+
+
+class Generator:
+	# Random stages in the stage_N.txt format: rectangular rooms joined by corridors one or two tiles
+	# wide until density of the board is floor, then the start and goal in far apart rooms, bridges on
+	# the corridors (one id per bridge, starting up or down at random), teleporters (tNt sends the block
+	# to tN0 and tN1 as two cubes), switches on the rooms (s fires on any contact, S only when standing;
+	# on, toggle or off for the bridges in turn) and soft floor on that part of the tiles left.
+	def __init__(self, width=20, height=20, density=0.45, bridges=2, switches=3, teleporters=0, soft=0.1,
+				 room_size=(2, 6), seed=None):
+		if width < 4 or height < 4:
+			raise ValueError('boards need at least 4 x 4 tiles')
+		if bridges > 10 or teleporters > 10:
+			raise ValueError('ids are one digit, at most 10 bridges and 10 teleporters')
+		if switches and not bridges:
+			raise ValueError('switches need a bridge to act on')
+		self.width = width
+		self.height = height
+		self.density = density
+		self.bridges = bridges
+		self.switches = switches
+		self.teleporters = teleporters
+		self.soft = soft
+		self.room_size = room_size
+		self.random = random.Random(seed)
+
+	def carve(self, tiles):
+		# returns the room tiles and the tiles only corridors cover
+		rooms = []
+		floor = set()
+		corridors = set()
+		target = self.density * self.width * self.height
+		smallest, largest = self.room_size
+		for _ in range(self.width * self.height):
+			if len(floor) >= target:
+				break
+			width = self.random.randint(smallest, min(largest, self.width))
+			height = self.random.randint(smallest, min(largest, self.height))
+			x = self.random.randrange(self.width - width + 1)
+			y = self.random.randrange(self.height - height + 1)
+			room = {(x + dx, y + dy) for dx in range(width) for dy in range(height)}
+			if rooms:
+				corridors |= self.get_corridor(self.random.choice(rooms), room)
+			rooms.append(room)
+			floor |= room | corridors
+
+		inside = set().union(*rooms)
+		corridors -= inside
+		for x, y in inside | corridors:
+			tiles[y][x] = Tile.floor
+		return rooms, sorted(corridors)
+
+	def get_corridor(self, first, second):
+		# L shaped, horizontal from a tile of first then vertical to a tile of second
+		x0, y0 = self.random.choice(sorted(first))
+		x1, y1 = self.random.choice(sorted(second))
+		wide = self.random.random() < 0.5
+		corridor = set()
+		for x in range(min(x0, x1), max(x0, x1) + 1):
+			corridor.add((x, y0))
+			if wide:
+				corridor.add((x, min(y0 + 1, self.height - 1)))
+		for y in range(min(y0, y1), max(y0, y1) + 1):
+			corridor.add((x1, y))
+			if wide:
+				corridor.add((min(x1 + 1, self.width - 1), y))
+		return corridor
+
+	def generate(self):
+		# returns the rows of tiles
+		tiles = [[Tile.empty] * self.width for _ in range(self.height)]
+		rooms, corridors = self.carve(tiles)
+		free = {(x, y) for y, row in enumerate(tiles) for x, tile in enumerate(row) if tile == Tile.floor}
+
+		start = self.random.choice(sorted(self.random.choice(rooms)))
+		# the goal somewhere in the farthest tenth of the floor from the start
+		far = sorted(free - {start}, key=lambda tile: -abs(tile[0] - start[0]) - abs(tile[1] - start[1]))
+		goal = self.random.choice(far[:max(1, len(far) // 10)])
+		tiles[start[1]][start[0]] = 'PPP'
+		tiles[goal[1]][goal[0]] = Tile.goal
+		free -= {start, goal}
+
+		corridors = [tile for tile in corridors if tile in free]
+		for bridge_id in range(self.bridges):
+			x, y = self.take(free, corridors)
+			tiles[y][x] = '{}2{}'.format(self.random.choice('bB'), bridge_id)
+		for teleport_id in range(self.teleporters):
+			for suffix in 't01':
+				x, y = self.take(free)
+				tiles[y][x] = 't{}{}'.format(teleport_id, suffix)
+		for index in range(self.switches):
+			x, y = self.take(free)
+			tiles[y][x] = '{}{}{}'.format(self.random.choice('sS'), self.random.choice('0112'), index % self.bridges)
+		for x, y in self.random.sample(sorted(free), int(self.soft * len(free))):
+			tiles[y][x] = Tile.soft_floor
+		return tiles
+
+	def take(self, free, preferred=()):
+		# a random free tile, from preferred while it has any
+		choices = [tile for tile in preferred if tile in free] or sorted(free)
+		if not choices:
+			raise ValueError('the board is too small for its features')
+		tile = self.random.choice(choices)
+		free.discard(tile)
+		return tile
+
+	@staticmethod
+	def to_text(tiles):
+		return ''.join(' '.join(row) + '\n' for row in tiles)
+
+
+def verify(level: Level):
+	# solves the stage with breadth-first search: the moves, None when unsolvable
+	return Solver.run(level, Method.breadth_first_search)[0]
+
+
+def generate_stage(options: dict, seed: int, min_length=1, attempts=100):
+	# the text of a solvable stage with an optimal solution of at least min_length moves, and its record
+	generator = Generator(seed=seed, **options)
+	for attempt in range(1, attempts + 1):
+		text = Generator.to_text(generator.generate())
+		level = Level(*parse_level(text.splitlines()))
+		moves = verify(level)
+		if moves is not None and len(moves) >= min_length:
+			# every state reachable from the start, only counted for the boards that are kept
+			states = len(StateGraph(level).keys)
+			record = {'seed': seed, 'attempts': attempt, 'length': len(moves), 'states': states}
+			record.update(options)
+			return text, record
+	return None, {'seed': seed, 'attempts': attempts, 'error': 'no solvable stage found'}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Generate random solvable stages and record their difficulty.')
+	parser.add_argument('-n', '--count', type=int, default=10, help='stages to generate')
+	parser.add_argument('-o', '--output', default=generated_directory, help='directory to write stage_N.txt to')
+	parser.add_argument('--first', type=int, default=1, help='number of the first stage file')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the first stage, the next ones count up')
+	parser.add_argument('-W', '--width', type=int, default=20)
+	parser.add_argument('-H', '--height', type=int, default=20)
+	parser.add_argument('--density', type=float, default=0.45, help='share of the board that is floor')
+	parser.add_argument('-b', '--bridges', type=int, default=2)
+	parser.add_argument('-s', '--switches', type=int, default=3)
+	parser.add_argument('-t', '--teleporters', type=int, default=0)
+	parser.add_argument('--soft', type=float, default=0.1, help='share of the plain floor made soft')
+	parser.add_argument('--min-length', type=int, default=1, help='least optimal solution length to accept')
+	parser.add_argument('--attempts', type=int, default=100, help='boards to try per stage')
+	args = parser.parse_args(argv)
+
+	options = {
+		'width': args.width, 'height': args.height, 'density': args.density, 'bridges': args.bridges,
+		'switches': args.switches, 'teleporters': args.teleporters, 'soft': args.soft,
+	}
+	os.makedirs(args.output, exist_ok=True)
+	with open(os.path.join(args.output, 'index.jsonl'), 'a') as index:
+		for number in range(args.first, args.first + args.count):
+			start = time.perf_counter()
+			text, record = generate_stage(options, args.seed + number - args.first, args.min_length, args.attempts)
+			record = dict({'stage': number, 'file': 'stage_{}.txt'.format(number)}, **record)
+			if text is not None:
+				with open(os.path.join(args.output, record['file']), 'w') as file:
+					file.write(text)
+			record['time_ms'] = round((time.perf_counter() - start) * 1000, 3)
+			index.write(json.dumps(record) + '\n')
+			print(json.dumps(record), flush=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,203 @@
+# coding=utf-8
+import argparse
+import json
+import os
+import time
+from array import array
+
+import numpy as np
+
+from level import Level, split_actions
+from solve import add_stage_arguments, parse_stages, stage_number
+
+action_ids = {action: index for index, action in enumerate(split_actions)}
+
+
+class StateGraph:
+	# The complete graph of the states reachable from a level's start, with the moves of
+	# Level.successors as edges. States get dense int32 ids in breadth-first order (the start is 0), and
+	# keys[id] is the packed Level key of each. Edges are three parallel arrays: sources, targets (ids)
+	# and actions (indices into split_actions). The game ends on the goal, so goal states have no
+	# outgoing edges.
+	def __init__(self, level: Level):
+		self.level = level
+		ids = {level.start: 0}
+		keys = array('q', [level.start])
+		sources = array('i')
+		targets = array('i')
+		actions = array('b')
+		index = 0
+		while index < len(keys):
+			key = keys[index]
+			if not level.is_goal(key):
+				for action, child in level.successors(key):
+					if child not in ids:
+						ids[child] = len(keys)
+						keys.append(child)
+					sources.append(index)
+					targets.append(ids[child])
+					actions.append(action_ids[action])
+			index += 1
+
+		self.keys = np.frombuffer(keys, np.int64)
+		self.sources = np.frombuffer(sources, np.int32)
+		self.targets = np.frombuffer(targets, np.int32)
+		self.actions = np.frombuffer(actions, np.int8)
+		self.goals = np.flatnonzero(self.keys // level.masks == level.goal_config).astype(np.int32)
+
+	def get_adjacency(self, reverse=False):
+		# compressed rows: the neighbours of node i are neighbours[offsets[i]:offsets[i + 1]]
+		sources, targets = (self.targets, self.sources) if reverse else (self.sources, self.targets)
+		order = np.argsort(sources, kind='stable')
+		offsets = np.zeros(len(self.keys) + 1, np.int64)
+		np.cumsum(np.bincount(sources, minlength=len(self.keys)), out=offsets[1:])
+		return offsets, targets[order]
+
+	def get_distances(self, starts, reverse=False):
+		# breadth-first search from all of starts at once, one NumPy pass per layer, -1 where unreached
+		offsets, neighbours = self.get_adjacency(reverse)
+		distances = np.full(len(self.keys), -1, np.int32)
+		frontier = np.unique(np.asarray(starts, np.int64))
+		distances[frontier] = 0
+		depth = 0
+		while frontier.size:
+			depth += 1
+			counts = offsets[frontier + 1] - offsets[frontier]
+			indices = np.repeat(offsets[frontier + 1] - counts.cumsum(), counts) + np.arange(counts.sum())
+			frontier = neighbours[indices]
+			frontier = np.unique(frontier[distances[frontier] < 0])
+			distances[frontier] = depth
+		return distances
+
+	def count_optimal_solutions(self, distances):
+		# number of distinct shortest move sequences from the start to the goal
+		if not self.goals.size or (distances[self.goals] < 0).all():
+			return 0
+		sources, targets = self.sources, self.targets
+		tight = (distances[sources] >= 0) & (distances[targets] == distances[sources] + 1)
+		sources, targets = sources[tight], targets[tight]
+		order = np.argsort(distances[sources], kind='stable')
+		# Python ints, the count can outgrow 64 bits
+		counts = [0] * len(self.keys)
+		counts[0] = 1
+		for source, target in zip(sources[order].tolist(), targets[order].tolist()):
+			counts[target] += counts[source]
+		reached = distances[self.goals]
+		best = reached[reached >= 0].min()
+		return sum(counts[goal] for goal in self.goals[reached == best].tolist())
+
+	def count_components(self, nodes):
+		# weakly connected components of the subgraph induced by the boolean mask nodes
+		parent = list(range(len(self.keys)))
+
+		def find(node):
+			while parent[node] != node:
+				parent[node] = parent[parent[node]]
+				node = parent[node]
+			return node
+
+		inside = nodes[self.sources] & nodes[self.targets]
+		for source, target in zip(self.sources[inside].tolist(), self.targets[inside].tolist()):
+			source, target = find(source), find(target)
+			if source != target:
+				parent[source] = target
+		return len({find(node) for node in np.flatnonzero(nodes).tolist()})
+
+	def get_diameter(self, chunk=1024):
+		# longest shortest path between any two states. Breadth-first searches from every state run
+		# side by side, one bit per search: reached[node] has bit i set once search i got there.
+		order = np.argsort(self.targets, kind='stable')
+		sources = self.sources[order]
+		targets = self.targets[order]
+		heads = np.flatnonzero(np.r_[True, targets[1:] != targets[:-1]]) if targets.size else np.zeros(0, np.int64)
+		heads_targets = targets[heads]
+		nodes = len(self.keys)
+		diameter = 0
+		for first in range(0, nodes, chunk):
+			count = min(chunk, nodes - first)
+			searches = np.arange(count)
+			reached = np.zeros((nodes, (count + 63) // 64), np.uint64)
+			reached[first + searches, searches // 64] = np.left_shift(np.uint64(1), (searches % 64).astype(np.uint64))
+			frontier = reached.copy()
+			depth = 0
+			while heads.size:
+				arrived = np.bitwise_or.reduceat(frontier[sources], heads, axis=0) & ~reached[heads_targets]
+				if not arrived.any():
+					break
+				depth += 1
+				frontier = np.zeros_like(reached)
+				frontier[heads_targets] = arrived
+				reached |= frontier
+			diameter = max(diameter, depth)
+		return diameter
+
+	def analyze(self, diameter_limit=12000):
+		distances = self.get_distances([0])
+		to_goal = self.get_distances(self.goals, reverse=True)
+		dead = to_goal < 0
+		solved = self.goals.size and (distances[self.goals] >= 0).any()
+		return {
+			'nodes': len(self.keys),
+			'edges': len(self.sources),
+			'goals': len(self.goals),
+			'optimal_length': int(distances[self.goals][distances[self.goals] >= 0].min()) if solved else None,
+			'optimal_solutions': self.count_optimal_solutions(distances),
+			'depth': int(distances.max()),
+			'dead_ends': int(dead.sum()),
+			'dead_end_components': self.count_components(dead),
+			# all-pairs, so only below diameter_limit states
+			'diameter': self.get_diameter() if len(self.keys) <= diameter_limit else None,
+		}
+
+	def save_npz(self, path: str):
+		np.savez_compressed(
+				path, keys=self.keys, sources=self.sources, targets=self.targets, actions=self.actions,
+				goals=self.goals, masks=self.level.masks, action_names=np.array(split_actions))
+
+	def save_graphml(self, path: str):
+		with open(path, 'w') as file:
+			file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+			file.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+			for name, kind, domain in [
+				('x0', 'int', 'node'), ('y0', 'int', 'node'), ('x1', 'int', 'node'), ('y1', 'int', 'node'),
+				('mask', 'long', 'node'), ('goal', 'boolean', 'node'), ('action', 'string', 'edge')]:
+				file.write('<key id="{0}" for="{2}" attr.name="{0}" attr.type="{1}"/>\n'.format(name, kind, domain))
+			file.write('<graph edgedefault="directed">\n')
+			goals = set(self.goals.tolist())
+			for node, key in enumerate(self.keys.tolist()):
+				x0, y0, x1, y1, mask = self.level.decode(key)
+				file.write(
+						'<node id="n{}"><data key="x0">{}</data><data key="y0">{}</data><data key="x1">{}</data>'
+						'<data key="y1">{}</data><data key="mask">{}</data><data key="goal">{}</data></node>\n'.format(
+								node, x0, y0, x1, y1, mask, 'true' if node in goals else 'false'))
+			for source, target, action in zip(self.sources.tolist(), self.targets.tolist(), self.actions.tolist()):
+				file.write('<edge source="n{}" target="n{}"><data key="action">{}</data></edge>\n'.format(
+						source, target, split_actions[action]))
+			file.write('</graph>\n</graphml>\n')
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Enumerate and analyze the reachable state graph of stages.')
+	add_stage_arguments(parser)
+	parser.add_argument('-o', '--output', help='directory to export the graphs to')
+	parser.add_argument('-f', '--format', choices=['npz', 'graphml'], default='npz', help='export format')
+	parser.add_argument('--diameter-limit', type=int, default=12000, help='skip the diameter above this many states')
+	args = parser.parse_args(argv)
+
+	paths = parse_stages(parser, args)
+
+	for path in paths:
+		start = time.perf_counter()
+		graph = StateGraph(Level.load(path))
+		result = {'stage': stage_number(path)}
+		result.update(graph.analyze(args.diameter_limit))
+		if args.output:
+			os.makedirs(args.output, exist_ok=True)
+			name = os.path.join(args.output, 'stage_{}.{}'.format(result['stage'], args.format))
+			graph.save_npz(name) if args.format == 'npz' else graph.save_graphml(name)
+		result['time_ms'] = round((time.perf_counter() - start) * 1000, 3)
+		print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,571 @@
+# coding=utf-8
+import json
+import os
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utility import Cell, Direction, Tile
+
+actions = ['up', 'down', 'left', 'right']
+split_actions = actions + ['swap']
+
+stages_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Stages')
+# bump when the layout of the compiled level cache changes, older cache files are then rebuilt
+cache_version = 2
+
+
+def parse_level(file):
+	# returns the rows of tiles, the bridges, switches and teleporters found in them, and the
+	# start and goal positions (None when the stage has no such tile)
+	level = []
+	bridges = {}
+	switches = {}
+	teleporter = {}
+	start = None
+	goal = None
+	for y, line in enumerate(file):
+		if line.strip():
+			row = [c for c in line.split() if c]
+			level.append(row)
+			for x, cell in enumerate(row):
+				for i in range(0, len(cell), 3):
+					# for every 3 characters
+					feature = cell[i:i + 3]
+					first_char = feature[0]
+					if first_char == 'b' or first_char == 'B':
+						bridge_id = feature[2]
+						if bridge_id in bridges:
+							bridges[bridge_id].append((x, y))
+						else:
+							bridges[bridge_id] = [(x, y)]
+					elif first_char == 's' or first_char == 'S':
+						if (x, y) in switches:
+							switches[(x, y)].append(feature)
+						else:
+							switches[(x, y)] = [feature]
+					elif first_char == 't':
+						if feature[2] != 't':
+							# { 't[0-9]t': [ t[0-9][0-1] ] }
+							trigger_id = 't' + feature[1] + 't'
+							if trigger_id in teleporter:
+								position = int(feature[2])
+								teleporter[trigger_id][position:position] = [[x, y]]
+							else:
+								teleporter[trigger_id] = [[x, y]]
+						else:
+							if (x, y) in switches:
+								switches[(x, y)].append(feature)
+							else:
+								switches[(x, y)] = [feature]
+					elif feature == Tile.goal:
+						goal = (x, y)
+					elif feature == 'PPP':
+						start = (x, y)
+
+	return level, bridges, switches, teleporter, start, goal
+
+
+def stage_path(number: int, directory=stages_directory):
+	return os.path.join(directory, 'stage_{}.txt'.format(number))
+
+
+def get_cache_path(path: str):
+	# stages/stage_1.txt -> stages/__pycache__/stage_1.npz
+	directory, name = os.path.split(path)
+	return os.path.join(directory, '__pycache__', os.path.splitext(name)[0] + '.npz')
+
+
+def load_stage(path: str, cache=True):
+	# returns what parse_level returns for the stage file, and its compiled Level. Both are read from
+	# a .npz cache when there is one at least as new as the file, and written to it otherwise.
+	source = os.stat(path)
+	cache_path = get_cache_path(path)
+	if cache:
+		try:
+			with np.load(cache_path) as data:
+				if data['version'] == cache_version and data['source'].tolist() == [source.st_mtime_ns, source.st_size]:
+					return Level.read_layout(data), Level.restore(data)
+		except (OSError, KeyError, ValueError):
+			pass
+
+	with open(path) as file:
+		layout = parse_level(file)
+	level = Level(*layout)
+	if cache:
+		try:
+			os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+			# written aside and renamed so that concurrent loaders never read half a file
+			temporary = '{}.{}.tmp'.format(cache_path, os.getpid())
+			with open(temporary, 'wb') as file:
+				np.savez(
+						file, version=cache_version, source=[source.st_mtime_ns, source.st_size],
+						**Level.write_layout(*layout), **level.save())
+			os.replace(temporary, cache_path)
+		except OSError:
+			pass
+	return layout, level
+
+
+class Level:
+	# Compiled, immutable view of a stage for the solvers. Tiles are integer classes (utility.Cell) in
+	# flat row-major arrays, the bridges are a bitmask (one bit per bridge id, in load order) and every
+	# switch tile points into a table of precomputed (and, xor) mask pairs.
+	#
+	# On top of that, every block configuration (x0, y0, x1, y1) reachable from the start with all
+	# bridges up gets a dense id, blocks holds the four ints of each in a row and configs maps them back
+	# (filled on the first encode for a restored level). The transition table holds for each (config, action) the next
+	# config (-1 when the move always falls), the bridge bits it needs up, and the ids of the switch
+	# effect and teleporter it fires. A search state is the int config * masks + mask, so expanding
+	# it is a handful of table lookups.
+	__slots__ = (
+		'width', 'height', 'goal', 'cells', 'bridge_bit',
+		'hard_switch', 'soft_switch', 'effects', 'effect_ids', 'teleport', 'teleports',
+		'masks', 'blocks', 'configs', 'next_config', 'need', 'effect', 'teleported', 'start', 'goal_config',
+		'inverse', 'distances'
+	)
+	# next_config entry of the swap action for a block that is not split
+	no_action = -2
+
+	def __init__(self, board, bridges: Dict[str, list], switches: Dict[tuple, list], teleporter: Dict[str, list],
+				 start: Optional[Tuple[int, int]], goal: Optional[Tuple[int, int]]):
+		if start is None:
+			raise ValueError('stage has no start tile')
+		self.height, self.width = len(board), len(board[0])
+		self.goal = goal
+		size = self.width * self.height
+
+		self.cells = array('b', [Cell.empty]) * size
+		for y, row in enumerate(board):
+			for x, tile in enumerate(row):
+				tile = str(tile)
+				if tile == Tile.empty:
+					continue
+				elif tile[0] == 'b' or tile[0] == 'B':
+					self.cells[y * self.width + x] = Cell.bridge
+				elif tile == Tile.soft_floor:
+					self.cells[y * self.width + x] = Cell.soft_floor
+				elif tile == Tile.goal:
+					self.cells[y * self.width + x] = Cell.goal
+				else:
+					self.cells[y * self.width + x] = Cell.floor
+
+		bits = {bridge_id: bit for bit, bridge_id in enumerate(bridges)}
+		self.bridge_bit = array('q', [0]) * size
+		for bridge_id, positions in bridges.items():
+			for (x, y) in positions:
+				self.bridge_bit[y * self.width + x] = 1 << bits[bridge_id]
+
+		# standing on a tile fires every switch on it, any other contact only fires the soft ones
+		self.hard_switch = array('h', [-1]) * size
+		self.soft_switch = array('h', [-1]) * size
+		self.effects: List[Tuple[int, int]] = []
+		self.effect_ids: Dict[Tuple[int, int], int] = {}
+		self.teleport = array('h', [-1]) * size
+		self.teleports: List[Tuple[int, int, int, int]] = []
+		for (x, y), features in switches.items():
+			index = y * self.width + x
+			hard = soft = (-1, 0)
+			for feature in features:
+				if feature[0] == 't':
+					(x0, y0), (x1, y1) = teleporter[feature]
+					self.teleport[index] = len(self.teleports)
+					self.teleports.append((x0, y0, x1, y1))
+				elif feature[2] in bits:
+					bit = 1 << bits[feature[2]]
+					hard = self.combine(hard, bit, feature[1])
+					if feature[0] == 's':
+						soft = self.combine(soft, bit, feature[1])
+			if hard != (-1, 0):
+				self.hard_switch[index] = self.get_effect_id(hard)
+			if soft != (-1, 0):
+				self.soft_switch[index] = self.get_effect_id(soft)
+
+		self.masks = 1 << len(bridges)
+		self.blocks = array('q')
+		self.configs: Optional[Dict[Tuple[int, int, int, int], int]] = {}
+		self.next_config = array('i')
+		self.need = array('q')
+		self.effect = array('h')
+		self.teleported = array('h')
+		self.compile_transitions(start)
+		start_mask = 0
+		for bit, positions in enumerate(bridges.values()):
+			x, y = positions[0]
+			if str(board[y][x])[0] == 'B':
+				start_mask |= 1 << bit
+		self.start = self.encode(start[0], start[1], start[0], start[1], start_mask)
+		# -1 without a goal tile, or when the block can't stand on it: is_goal is then never true
+		self.goal_config = self.configs.get((goal[0], goal[1], goal[0], goal[1]), -1) if goal is not None else -1
+		self.inverse: List[List[int]] = []
+		# distances.Distances of this level, built on first use
+		self.distances = None
+
+	@staticmethod
+	def load(path: str, cache=True):
+		return load_stage(path, cache)[1]
+
+	def save(self):
+		# the compiled tables as NumPy arrays, for load_stage's cache
+		return {
+			'size': [self.width, self.height, self.masks, self.start, self.goal_config, *(self.goal or (-1, -1))],
+			'cells': np.frombuffer(self.cells, np.int8),
+			'bridge_bit': np.frombuffer(self.bridge_bit, np.int64),
+			'hard_switch': np.frombuffer(self.hard_switch, np.int16),
+			'soft_switch': np.frombuffer(self.soft_switch, np.int16),
+			'teleport': np.frombuffer(self.teleport, np.int16),
+			'effects': np.array(self.effects, np.int64).reshape(-1, 2),
+			'teleports': np.array(self.teleports, np.int64).reshape(-1, 4),
+			'blocks': np.frombuffer(self.blocks, np.int64).reshape(-1, 4),
+			'next_config': np.frombuffer(self.next_config, np.int32),
+			'need': np.frombuffer(self.need, np.int64),
+			'effect': np.frombuffer(self.effect, np.int16),
+			'teleported': np.frombuffer(self.teleported, np.int16),
+		}
+
+	@staticmethod
+	def restore(data, copy=True):
+		# inverse of save, without parsing or compiling anything. With copy=False the flat tables are
+		# read-only views of data's arrays instead of copies, for arrays in shared memory. configs is left
+		# to the first encode, which searches from level.start don't make.
+		def table(name: str, code: str):
+			if copy:
+				return array(code, data[name].tobytes())
+			return memoryview(data[name]).cast('B').cast(code).toreadonly()
+
+		level = Level.__new__(Level)
+		level.width, level.height, level.masks, level.start, level.goal_config, *goal = data['size'].tolist()
+		level.goal = tuple(goal) if goal[0] >= 0 else None
+		level.cells = table('cells', 'b')
+		level.bridge_bit = table('bridge_bit', 'q')
+		level.hard_switch = table('hard_switch', 'h')
+		level.soft_switch = table('soft_switch', 'h')
+		level.teleport = table('teleport', 'h')
+		level.effects = [tuple(effect) for effect in data['effects'].tolist()]
+		level.effect_ids = {effect: index for index, effect in enumerate(level.effects)}
+		level.teleports = [tuple(teleport) for teleport in data['teleports'].tolist()]
+		level.blocks = table('blocks', 'q')
+		level.configs = None
+		level.next_config = table('next_config', 'i')
+		level.need = table('need', 'q')
+		level.effect = table('effect', 'h')
+		level.teleported = table('teleported', 'h')
+		level.inverse = []
+		level.distances = None
+		return level
+
+	@staticmethod
+	def write_layout(board, bridges, switches, teleporter, start, goal):
+		# parse_level's result as NumPy arrays, the tiles as strings and the rest as JSON
+		return {
+			'tiles': np.array(board, dtype=str),
+			'layout': json.dumps({
+				'bridges': bridges,
+				'switches': [[x, y, features] for (x, y), features in switches.items()],
+				'teleporter': teleporter,
+				'start': start,
+				'goal': goal,
+			}),
+		}
+
+	@staticmethod
+	def read_layout(data):
+		layout = json.loads(str(data['layout']))
+		bridges = {bridge_id: [tuple(position) for position in positions]
+				   for bridge_id, positions in layout['bridges'].items()}
+		switches = {(x, y): features for x, y, features in layout['switches']}
+		start = tuple(layout['start']) if layout['start'] is not None else None
+		goal = tuple(layout['goal']) if layout['goal'] is not None else None
+		return data['tiles'].tolist(), bridges, switches, layout['teleporter'], start, goal
+
+	@staticmethod
+	def combine(effect: Tuple[int, int], bit: int, mode: str):
+		# fold a switch into the effect: mask -> (mask & and_mask) ^ xor_mask
+		and_mask, xor_mask = effect
+		if mode == '0':
+			# on: OR the bit in
+			return and_mask & ~bit, xor_mask | bit
+		elif mode == '2':
+			# off: AND the bit out
+			return and_mask & ~bit, xor_mask & ~bit
+		# toggle: XOR the bit
+		return and_mask, xor_mask ^ bit
+
+	def get_effect_id(self, effect: Tuple[int, int]):
+		if effect not in self.effect_ids:
+			self.effect_ids[effect] = len(self.effects)
+			self.effects.append(effect)
+		return self.effect_ids[effect]
+
+	def get_size(self):
+		# number of keys, config * masks + mask for every config
+		return len(self.blocks) // 4 * self.masks
+
+	def encode(self, x0: int, y0: int, x1: int, y1: int, mask: int):
+		if self.configs is None:
+			blocks = self.blocks
+			self.configs = {tuple(blocks[index:index + 4]): index >> 2 for index in range(0, len(blocks), 4)}
+		return self.configs[(x0, y0, x1, y1)] * self.masks + mask
+
+	def decode(self, key: int):
+		config, mask = divmod(key, self.masks)
+		index = config << 2
+		blocks = self.blocks
+		return blocks[index], blocks[index + 1], blocks[index + 2], blocks[index + 3], mask
+
+	@staticmethod
+	def get_direction(x0: int, y0: int, x1: int, y1: int):
+		dx, dy = x1 - x0, y1 - y0
+		if dx == 0 and dy == 0:
+			return Direction.standing
+		elif (dx == 1 or dx == -1) and dy == 0:
+			return Direction.laying_x
+		elif (dy == 1 or dy == -1) and dx == 0:
+			return Direction.laying_y
+		return Direction.none
+
+	@staticmethod
+	def roll(x0: int, y0: int, x1: int, y1: int, action: str):
+		direction = Level.get_direction(x0, y0, x1, y1)
+		if direction == Direction.standing:
+			if action == 'up':
+				return x0, y0 - 2, x1, y1 - 1
+			elif action == 'down':
+				return x0, y0 + 1, x1, y1 + 2
+			elif action == 'left':
+				return x0 - 2, y0, x1 - 1, y1
+			return x0 + 1, y0, x1 + 2, y1
+		elif direction == Direction.laying_x:
+			if action == 'up':
+				return x0, y0 - 1, x1, y1 - 1
+			elif action == 'down':
+				return x0, y0 + 1, x1, y1 + 1
+			elif action == 'left':
+				return x0 - 1, y0, x1 - 2, y1
+			return x0 + 2, y0, x1 + 1, y1
+		elif direction == Direction.laying_y:
+			if action == 'up':
+				return x0, y0 - 1, x1, y1 - 2
+			elif action == 'down':
+				return x0, y0 + 2, x1, y1 + 1
+			elif action == 'left':
+				return x0 - 1, y0, x1 - 1, y1
+			return x0 + 1, y0, x1 + 1, y1
+		if action == 'up':
+			return x0, y0 - 1, x1, y1
+		elif action == 'down':
+			return x0, y0 + 1, x1, y1
+		elif action == 'left':
+			return x0 - 1, y0, x1, y1
+		elif action == 'right':
+			return x0 + 1, y0, x1, y1
+		return x1, y1, x0, y0
+
+	def get_requirement(self, x0: int, y0: int, x1: int, y1: int):
+		# bridge bits that must be up for the block to rest here, or -1 when it can never rest here
+		need = 0
+		for x, y in ((x0, y0), (x1, y1)):
+			if not (0 <= x < self.width and 0 <= y < self.height):
+				return -1
+			index = y * self.width + x
+			cell = self.cells[index]
+			if cell == Cell.empty:
+				return -1
+			elif cell == Cell.bridge:
+				need |= self.bridge_bit[index]
+		if x0 == x1 and y0 == y1 and self.cells[y0 * self.width + x0] == Cell.soft_floor:
+			return -1
+		return need
+
+	def is_floor(self, x: int, y: int, mask: int):
+		if not (0 <= x < self.width and 0 <= y < self.height):
+			return False
+		index = y * self.width + x
+		cell = self.cells[index]
+		if cell == Cell.bridge:
+			return mask & self.bridge_bit[index] != 0
+		return cell != Cell.empty
+
+	def is_valid(self, x0: int, y0: int, x1: int, y1: int, mask: int):
+		need = self.get_requirement(x0, y0, x1, y1)
+		return need >= 0 and need & mask == need
+
+	def get_switches(self, x0: int, y0: int, x1: int, y1: int):
+		# switch effect and teleporter fired by the block landing here, and where it ends up
+		direction = self.get_direction(x0, y0, x1, y1)
+		first = y0 * self.width + x0
+		effect = teleport = -1
+		if direction == Direction.standing:
+			effect = self.hard_switch[first]
+			teleport = self.teleport[first]
+			if teleport >= 0:
+				x0, y0, x1, y1 = self.teleports[teleport]
+		else:
+			effect = self.soft_switch[first]
+			second = y1 * self.width + x1
+			if direction != Direction.none and self.soft_switch[second] >= 0:
+				if effect < 0:
+					effect = self.soft_switch[second]
+				else:
+					# (m & a1 ^ x1) & a2 ^ x2 == m & (a1 & a2) ^ (x1 & a2 ^ x2)
+					and_1, xor_1 = self.effects[effect]
+					and_2, xor_2 = self.effects[self.soft_switch[second]]
+					effect = self.get_effect_id((and_1 & and_2, (xor_1 & and_2) ^ xor_2))
+
+		# keep the first cube at the smaller coordinate once the halves line up
+		if (x1 - x0 == -1 and y1 == y0) or (y1 - y0 == -1 and x1 == x0):
+			x0, y0, x1, y1 = x1, y1, x0, y0
+		return (x0, y0, x1, y1), effect, teleport
+
+	def compile_transitions(self, start: Tuple[int, int]):
+		self.configs[(start[0], start[1], start[0], start[1])] = 0
+		self.blocks.extend((start[0], start[1], start[0], start[1]))
+		config = 0
+		while config < len(self.configs):
+			block = tuple(self.blocks[config << 2:(config + 1) << 2])
+			split = self.get_direction(*block) == Direction.none
+			for action in split_actions:
+				target, need, effect, teleport = Level.no_action, 0, -1, -1
+				if action != 'swap' or split:
+					target = -1
+					rolled = self.roll(*block, action)
+					need = self.get_requirement(*rolled)
+					if need >= 0:
+						if action == 'swap':
+							landed = rolled
+						else:
+							landed, effect, teleport = self.get_switches(*rolled)
+						if landed not in self.configs:
+							self.configs[landed] = len(self.configs)
+							self.blocks.extend(landed)
+						target = self.configs[landed]
+					else:
+						need = 0
+				self.next_config.append(target)
+				self.need.append(need)
+				self.effect.append(effect)
+				self.teleported.append(teleport)
+			config += 1
+
+	def successors(self, key: int, stats=None):
+		config, mask = divmod(key, self.masks)
+		base = config * 5
+		result = []
+		for action in range(5):
+			target = self.next_config[base + action]
+			if target < 0 or self.need[base + action] & ~mask:
+				if stats is not None and target != Level.no_action:
+					stats.invalid += 1
+				continue
+
+			effect = self.effect[base + action]
+			if effect >= 0:
+				and_mask, xor_mask = self.effects[effect]
+				result.append((split_actions[action], target * self.masks + ((mask & and_mask) ^ xor_mask)))
+			else:
+				result.append((split_actions[action], target * self.masks + mask))
+		return result
+
+	def get_goals(self, start: Optional[int] = None):
+		# the goal config under every mask, or only under those that agree with start's mask on the
+		# bridges no switch ever changes
+		if self.goal_config < 0:
+			return []
+		full = self.masks - 1
+		fixed = full
+		for and_mask, xor_mask in self.effects:
+			fixed &= and_mask & ~xor_mask
+		base = self.goal_config * self.masks
+		if start is None:
+			return [base + mask for mask in range(self.masks)]
+		return [base + mask for mask in range(self.masks) if (mask ^ start) & fixed == 0]
+
+	def get_inverse(self):
+		# config -> the transition table indices that lead to it, built on first use
+		if not self.inverse:
+			self.inverse = [[] for _ in range(len(self.blocks) // 4)]
+			for index, target in enumerate(self.next_config):
+				if target >= 0:
+					self.inverse[target].append(index)
+		return self.inverse
+
+	def preimages(self, key: int, stats=None):
+		# inverse of successors: every (action, previous key) that lands on key. A switch that forced
+		# bridges up or down yields one previous key per setting those bridges could have had.
+		config, mask = divmod(key, self.masks)
+		full = self.masks - 1
+		result = []
+		for index in self.get_inverse()[config]:
+			and_mask, xor_mask = self.effects[self.effect[index]] if self.effect[index] >= 0 else (-1, 0)
+			forced = ~and_mask & full
+			if (mask ^ xor_mask) & forced:
+				continue
+
+			base = (mask ^ xor_mask) & and_mask & full
+			previous, action = divmod(index, 5)
+			free = forced
+			while True:
+				before = base | free
+				if self.need[index] & before == self.need[index]:
+					result.append((split_actions[action], previous * self.masks + before))
+				elif stats is not None:
+					stats.invalid += 1
+				if not free:
+					break
+				free = (free - 1) & forced
+		return result
+
+	def is_goal(self, key: int):
+		return key // self.masks == self.goal_config
+
+	@staticmethod
+	def get_path(parents: Dict[int, tuple], key: int):
+		path: List[str] = []
+		while parents[key] is not None:
+			key, action = parents[key]
+			path.append(action)
+		path.reverse()
+		return path
+
+
+class Block:
+	# The player's two cubes, first (x0, y0) and second (x1, y1), the same tile when standing. Plain ints
+	# in slots since the game logic handles a block several times per move, which is a handful of
+	# comparisons; unpacks to the x0, y0, x1, y1 arguments of the Level methods.
+	__slots__ = ('x0', 'y0', 'x1', 'y1')
+
+	def __init__(self, x0: int, y0: int, x1: int, y1: int):
+		self.x0 = x0
+		self.y0 = y0
+		self.x1 = x1
+		self.y1 = y1
+
+	def __iter__(self):
+		return iter((self.x0, self.y0, self.x1, self.y1))
+
+	def __eq__(self, other):
+		return isinstance(other, Block) and tuple(self) == tuple(other)
+
+	def __hash__(self):
+		return hash(tuple(self))
+
+	def __repr__(self):
+		return 'Block({}, {}, {}, {})'.format(*self)
+
+	@property
+	def first(self):
+		return self.x0, self.y0
+
+	@property
+	def second(self):
+		return self.x1, self.y1
+
+	def get_direction(self):
+		return Level.get_direction(self.x0, self.y0, self.x1, self.y1)
+
+	def roll(self, action: str):
+		return Block(*Level.roll(self.x0, self.y0, self.x1, self.y1, action))
+
+	def swapped(self):
+		return Block(self.x1, self.y1, self.x0, self.y0)
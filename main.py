@@ -1,85 +1,101 @@
 # coding=utf-8
-import time
-
 import pygame
 
 from state import State
 from utility import Method
 
 
-def time_function(func, stage, *args):
-	import os
-	import psutil
-	process = psutil.Process(os.getpid())
-	before = process.memory_info().rss / 1024 / 1024
-	start = time.clock()
-	func(*args)
-	end = time.clock()
-	total = (end - start) * 1000
-	after = process.memory_info().rss / 1024 / 1024
-	print('Memory (Before): {0:.3f}MB'.format(before))
-	print('Memory (After): {0:.3f}MB'.format(after))
-	print('Time to complete: {0:.3f} ms'.format(total))
-
-	with open('result2.txt') as file:
-		lines = file.readlines()
-
-	with open('result2.txt', 'w') as file:
-		string = '{0:.3f}\t{1:.3f}\t{2:.3f}\n'.format(before, after, total)
-		if len(lines) == 0:
-			lines = [string]
-		elif int(stage) - 1 >= len(lines):
-			lines += [string]
-		else:
-			result = lines[-1].split('\t')
-			if float(result[2]) > total:
-				lines = lines[:-1] + [string]
-		file.writelines(lines)
+def get_key(state: State):
+	# the level key of the position, with the halves of a block that has just merged in Level's order
+	player = state.player.swapped() if state.check_merge(state.player) else state.player
+	return state.encode(player, state.board)
+
 
+def describe(answer: tuple, hint: bool):
+	# window title text for a planner.Planner answer, with the best next move when hint is set
+	_, left, action = answer
+	if left < 0:
+		return 'unwinnable, ctrl+r restarts'
+	if left == 0:
+		return 'solved'
+	text = '{} moves to goal'.format(left)
+	return '{}, next: {}'.format(text, action) if hint else text
 
-def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1):
+
+def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1, fps=60, cache=True):
 	state = State(stage=stage)
 
 	if not playable:
 		from solver import Solver
 		if visualize:
-			if method is Method.hill_climbing:
-				# path = Solver.hill_climbing(state)
-				return
+			if cache:
+				# solved once per stage contents and method, so replays start right away
+				from solutions import Solutions
+				path = Solutions().solve(state.path, method, state.level)[0]
+			elif method is Method.hill_climbing:
+				path = Solver.hill_climbing_path(state)
 			elif method is Method.breadth_first_search:
 				path = Solver.bfs_path(state)
 			elif method is Method.depth_first_search:
 				path = Solver.dfs_path(state)
+			elif method is Method.bidirectional_search:
+				path = Solver.bidirectional_path(state)
+			elif method is Method.batched_breadth_first_search:
+				path = Solver.batched_path(state)
+			elif method is Method.iterative_deepening:
+				path = Solver.iterative_deepening_path(state)
 			else:
 				return
 			# reset position
 			state.restart()
 		else:
-			if method is Method.hill_climbing:
-				# Solver.hill_climbing(state)
-				return
-			elif method is Method.breadth_first_search:
-				time_function(Solver.bfs, stage, state)
-			elif method is Method.depth_first_search:
-				time_function(Solver.dfs, stage, state)
+			from benchmark import measure
+			result = measure(state.level, method)
+			print('Solution length: {}'.format(result['length']))
+			print('States: {}'.format(result['states']))
+			print('Time to complete (median of {runs}): {median_ms:.3f} ms'.format(**result))
+			print('Peak memory: {0:.3f}KB'.format(result['peak_kb']))
 			return
 
+	planner = None
+	requested = None
+	if playable:
+		# re-plans from every position in the background, the moves left are shown in the window title
+		from planner import Planner
+		planner = Planner(state.path)
+		requested = get_key(state)
+		planner.request(requested)
+
 	from display import Display
 	pygame.init()
-	display = Display('Bloxorz', offset=(state.board.shape[1], state.board.shape[0]))
+	display = Display('Bloxorz', fps=fps, offset=(state.board.shape[1], state.board.shape[0]))
 
 	steps = 0
 	next_action = ''
+	hint = False
+	shown = None
 	while True:
 		if next_action != '' and state.degree == 90:
 			state.degree = 0
-			state.move(next_action)
+			if state.move(next_action) and planner is not None:
+				requested = get_key(state)
+				planner.request(requested)
 			next_action = ''
 			if not playable:
 				steps += 1
 
+		if planner is not None:
+			answer = planner.answer()
+			# answers for positions left since are skipped
+			if answer is not None and answer[0] == requested and (answer, hint) != shown:
+				display.set_caption(describe(answer, hint))
+				shown = (answer, hint)
+
 		for event in pygame.event.get():
 			if display.is_trying_to_quit(event):
+				if planner is not None:
+					planner.close()
+				state.delete_lists()
 				pygame.quit()
 				return
 
@@ -95,10 +111,14 @@ def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1):
 						next_action = 'right'
 					elif event.key == pygame.K_SPACE:
 						next_action = 'swap'
+					elif event.key == pygame.K_h:
+						hint = not hint
 					elif event.key == pygame.K_r and pygame.key.get_mods() and pygame.KMOD_CTRL:
 						state.restart()
 						next_action = ''
-					if state.check_goal(state.player, state.board):
+						requested = get_key(state)
+						planner.request(requested)
+					if state.check_goal(state.player):
 						next_action = ''
 				else:
 					if event.key == pygame.K_RIGHT or event.key == pygame.K_DOWN:
@@ -117,11 +137,14 @@ def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1):
 		state.draw_level()
 		state.draw_player()
 		display.update()
+		state.delta = display.delta
 
 
-main(
-		stage=4,
-		playable=True,
-		visualize=False,
-		method=Method.breadth_first_search
-)
+# the planner's worker process imports this module again where processes are spawned
+if __name__ == '__main__':
+	main(
+			stage=4,
+			playable=True,
+			visualize=False,
+			method=Method.breadth_first_search
+	)
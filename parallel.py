@@ -0,0 +1,176 @@
+# coding=utf-8
+import argparse
+import json
+import os
+import time
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from level import Level
+from solve import add_stage_arguments, methods, parse_stages, peak_rss, stage_number
+from solver import Solver
+
+
+class SharedLevels:
+	# The compiled tables (Level.save) of a set of stages, each stage's arrays packed into one
+	# multiprocessing.shared_memory block by the parent. Workers only get the layouts (block name and
+	# where every array is in it) and attach to Levels whose tables are read-only views of the blocks,
+	# so nothing is parsed, compiled or copied per job.
+	def __init__(self, paths):
+		self.blocks = []
+		self.layouts = {}
+		try:
+			for path in paths:
+				self.add(path)
+		except BaseException:
+			self.close()
+			raise
+
+	def add(self, path: str):
+		arrays = {name: np.ascontiguousarray(value) for name, value in Level.load(path).save().items()}
+		offsets = {}
+		size = 0
+		for name, value in arrays.items():
+			# every array starts 8 byte aligned
+			size = (size + 7) & ~7
+			offsets[name] = size
+			size += value.nbytes
+		block = SharedMemory(create=True, size=max(size, 1))
+		self.blocks.append(block)
+		fields = []
+		for name, value in arrays.items():
+			np.ndarray(value.shape, value.dtype, block.buf, offsets[name])[...] = value
+			fields.append((name, value.dtype.str, value.shape, offsets[name]))
+		self.layouts[path] = (block.name, fields)
+
+	@staticmethod
+	def attach(layout):
+		# returns the block, which must be kept open while the level is used, and the level
+		name, fields = layout
+		block = SharedMemory(name)
+		data = {name: np.ndarray(shape, dtype, block.buf, offset) for name, dtype, shape, offset in fields}
+		return block, Level.restore(data, copy=False)
+
+	def close(self):
+		for block in self.blocks:
+			block.close()
+			block.unlink()
+		self.blocks = []
+
+
+def work(connection, layouts):
+	# worker process: solves the (path, method name) jobs it receives until it gets None
+	levels = {}
+	for path, method in iter(connection.recv, None):
+		result = {'stage': stage_number(path), 'file': os.path.basename(path), 'method': method}
+		try:
+			if path not in levels:
+				levels[path] = SharedLevels.attach(layouts[path])
+			start = time.perf_counter()
+			moves, states = Solver.run(levels[path][1], methods[method])
+			total = (time.perf_counter() - start) * 1000
+			result.update({
+				'path': moves,
+				'length': len(moves) if moves is not None else None,
+				'states': states,
+				'time_ms': round(total, 3),
+				'peak_rss_mb': round(peak_rss(), 3),
+			})
+		except Exception as error:
+			result['error'] = repr(error)
+		connection.send(result)
+
+
+def run(paths, method_names, processes=os.cpu_count(), timeout=None):
+	# solves every (stage, method) pair on worker processes and yields the results as they complete.
+	# A job running longer than timeout seconds has its worker killed and replaced, and yields
+	# {'timeout': true}.
+	levels = SharedLevels(paths)
+	pending = deque((path, method) for path in paths for method in method_names)
+	# connection -> [process, job, deadline]
+	workers = {}
+
+	def start_worker():
+		connection, child = Pipe()
+		process = Process(target=work, args=(child, levels.layouts), daemon=True)
+		process.start()
+		child.close()
+		workers[connection] = [process, None, None]
+		dispatch(connection)
+
+	def dispatch(connection):
+		worker = workers[connection]
+		if pending:
+			worker[1] = pending.popleft()
+			worker[2] = time.monotonic() + timeout if timeout else None
+			connection.send(worker[1])
+		else:
+			connection.send(None)
+			connection.close()
+			worker[0].join()
+			del workers[connection]
+
+	def stop_worker(connection):
+		process, job = workers.pop(connection)[:2]
+		process.kill()
+		process.join()
+		connection.close()
+		return {'stage': stage_number(job[0]), 'file': os.path.basename(job[0]), 'method': job[1]}
+
+	try:
+		for _ in range(min(processes, len(pending))):
+			start_worker()
+		while workers:
+			deadlines = [worker[2] for worker in workers.values() if worker[2] is not None]
+			wait_time = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+			for connection in wait(list(workers), wait_time):
+				try:
+					result = connection.recv()
+				except EOFError:
+					# the worker died without answering, e.g. out of memory
+					process = workers[connection][0]
+					result = stop_worker(connection)
+					result['error'] = 'worker exited with code {}'.format(process.exitcode)
+					yield result
+					if pending:
+						start_worker()
+					continue
+				yield result
+				dispatch(connection)
+
+			now = time.monotonic()
+			for connection, worker in list(workers.items()):
+				if worker[2] is not None and worker[2] <= now:
+					result = stop_worker(connection)
+					result.update({'timeout': True, 'time_ms': round(timeout * 1000, 3)})
+					yield result
+					if pending:
+						start_worker()
+	finally:
+		for connection in list(workers):
+			stop_worker(connection)
+		levels.close()
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Solve stages under several methods on a pool of processes.')
+	add_stage_arguments(parser)
+	parser.add_argument('-m', '--method', action='append', choices=sorted(methods), help='default: all')
+	parser.add_argument('-j', '--processes', type=int, default=os.cpu_count(), help='worker processes')
+	parser.add_argument('-t', '--timeout', type=float, default=60, help='seconds per job, 0 for no limit')
+	args = parser.parse_args(argv)
+
+	paths = parse_stages(parser, args)
+
+	start = time.perf_counter()
+	for result in run(paths, args.method or sorted(methods), args.processes, args.timeout):
+		print(json.dumps(result), flush=True)
+	print(json.dumps({'total_ms': round((time.perf_counter() - start) * 1000, 3)}), flush=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,54 @@
+# coding=utf-8
+import os
+from multiprocessing import Pipe, Process
+
+from distances import Distances
+from level import Level
+
+
+def plan(connection, path: str):
+	# worker process: answers the newest position it has been sent, the ones before it are skipped,
+	# until it gets None. It runs at a lower priority than the game, which matters on a single core.
+	if hasattr(os, 'nice'):
+		os.nice(10)
+	distances = Distances.of(Level.load(path))
+	while True:
+		key = connection.recv()
+		while key is not None and connection.poll():
+			key = connection.recv()
+		if key is None:
+			return
+		connection.send((key, distances.get_distance(key), distances.get_hint(key)))
+
+
+class Planner:
+	# Keeps the moves left to the goal from the live game's position up to date from a worker process,
+	# so that the render loop never waits on a search, nor on the interpreter lock. The worker loads the
+	# stage file, builds its distances.Distances table once and every plan after that is a lookup in it.
+	# request() hands over the position after each move and answer() returns the newest
+	# (key, moves left or -1, best move) without waiting, None before the first one.
+	def __init__(self, path: str):
+		self.connection, child = Pipe()
+		self.process = Process(target=plan, args=(child, path), daemon=True)
+		self.process.start()
+		child.close()
+		self.result = None
+
+	def request(self, key: int):
+		try:
+			self.connection.send(key)
+		except OSError:
+			# the worker is gone, the game goes on without plans
+			pass
+
+	def answer(self):
+		try:
+			while self.connection.poll():
+				self.result = self.connection.recv()
+		except (EOFError, OSError):
+			pass
+		return self.result
+
+	def close(self):
+		self.request(None)
+		self.connection.close()
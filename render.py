@@ -0,0 +1,186 @@
+# coding=utf-8
+import argparse
+import ctypes
+import json
+import os
+import struct
+import time
+import zlib
+
+from solve import add_stage_arguments, methods, parse_stages, stage_number
+
+backends = ['egl', 'osmesa']
+
+
+class Offscreen:
+	# An OpenGL context without a window, for machines with no display. 'egl' renders through Mesa's
+	# surfaceless EGL platform, 'osmesa' through libOSMesa; both fall back to software rendering.
+	# PyOpenGL binds its platform on the first import, so nothing may import OpenGL before use().
+	def __init__(self, backend='egl', size=(800, 600), offset=(0, 0)):
+		self.backend = backend
+		self.size = size
+		self.width, self.height = offset
+		if backend == 'egl':
+			self.create_egl()
+		else:
+			self.create_osmesa()
+
+		from OpenGL.GL import glViewport
+		from draw import Draw
+		glViewport(0, 0, size[0], size[1])
+		Draw.setup_view(size, offset)
+
+	@staticmethod
+	def use(backend: str):
+		os.environ['PYOPENGL_PLATFORM'] = backend
+		if backend == 'egl':
+			os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+	def create_egl(self):
+		from OpenGL import EGL
+		self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+		if not EGL.eglInitialize(self.display, None, None):
+			raise RuntimeError('no EGL display')
+
+		attributes = (EGL.EGLint * 9)(
+				EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+				EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_ALPHA_SIZE, 8, EGL.EGL_NONE)
+		config = EGL.EGLConfig()
+		count = EGL.EGLint()
+		EGL.eglChooseConfig(self.display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count))
+		if not count.value:
+			raise RuntimeError('no EGL config with a pbuffer and desktop OpenGL')
+
+		# desktop OpenGL rather than GLES, the drawing code is fixed-function
+		EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+		size = (EGL.EGLint * 5)(EGL.EGL_WIDTH, self.size[0], EGL.EGL_HEIGHT, self.size[1], EGL.EGL_NONE)
+		self.surface = EGL.eglCreatePbufferSurface(self.display, config, size)
+		self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+		if not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+			raise RuntimeError('could not make the EGL context current')
+
+	def create_osmesa(self):
+		from OpenGL import GL, arrays, osmesa
+		self.context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+		if not self.context:
+			raise RuntimeError('could not create an OSMesa context')
+
+		self.buffer = arrays.GLubyteArray.zeros((self.size[1], self.size[0], 4))
+		if not osmesa.OSMesaMakeCurrent(self.context, self.buffer, GL.GL_UNSIGNED_BYTE, *self.size):
+			raise RuntimeError('could not make the OSMesa context current')
+
+	def clear(self):
+		from OpenGL.GL import GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, glClear
+		glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+	def finish(self):
+		from OpenGL.GL import glFinish
+		glFinish()
+
+	def read(self):
+		# RGB rows of the frame, top row first
+		from OpenGL.GL import GL_PACK_ALIGNMENT, GL_RGB, GL_UNSIGNED_BYTE, glPixelStorei, glReadPixels
+		glPixelStorei(GL_PACK_ALIGNMENT, 1)
+		width, height = self.size
+		pixels = glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE)
+		row = width * 3
+		return [pixels[y * row:(y + 1) * row] for y in reversed(range(height))]
+
+	def close(self):
+		if self.backend == 'egl':
+			from OpenGL import EGL
+			EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+			EGL.eglDestroyContext(self.display, self.context)
+			EGL.eglDestroySurface(self.display, self.surface)
+			EGL.eglTerminate(self.display)
+		else:
+			from OpenGL import osmesa
+			osmesa.OSMesaDestroyContext(self.context)
+
+
+def write_png(path: str, rows, width: int, height: int):
+	# 8 bit RGB, every row with filter type 0
+	def chunk(kind: bytes, data: bytes):
+		return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+	raw = b''.join(b'\0' + bytes(row) for row in rows)
+	with open(path, 'wb') as file:
+		file.write(b'\x89PNG\r\n\x1a\n')
+		file.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+		file.write(chunk(b'IDAT', zlib.compress(raw, 6)))
+		file.write(chunk(b'IEND', b''))
+
+
+def play(state, path, limit=1000):
+	# yield once per frame while the solution is played back the way main() plays it, an animation
+	# lasts until state.degree is back at 90
+	for action in [None] + list(path):
+		if action is not None:
+			state.degree = 0
+			state.move(action)
+		for _ in range(limit):
+			yield
+			if state.degree == 90:
+				break
+
+
+def render_stage(path: str, method: str, backend='egl', size=(800, 600), output=None):
+	Offscreen.use(backend)
+	from solver import Solver
+	from state import State
+
+	stage = stage_number(path)
+	state = State(stage, os.path.dirname(path))
+	moves = Solver.run(state.level, methods[method])[0] or []
+	screen = Offscreen(backend, size, (state.board.shape[1], state.board.shape[0]))
+
+	directory = None
+	if output:
+		directory = os.path.join(output, 'stage_{}'.format(stage))
+		os.makedirs(directory, exist_ok=True)
+
+	frames = 0
+	drawing = 0
+	for _ in play(state, moves):
+		start = time.perf_counter()
+		screen.clear()
+		state.draw_level()
+		state.draw_player()
+		screen.finish()
+		drawing += time.perf_counter() - start
+		# frames are written outside the timed part
+		if directory is not None:
+			write_png(os.path.join(directory, 'frame_{:04d}.png'.format(frames)), screen.read(), *size)
+		frames += 1
+	state.delete_lists()
+	screen.close()
+
+	return {
+		'stage': stage,
+		'method': method,
+		'backend': backend,
+		'length': len(moves),
+		'frames': frames,
+		'fps': round(frames / drawing, 2) if drawing else None,
+		'frame_ms': round(drawing * 1000 / frames, 3) if frames else None,
+	}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Render solved stages offscreen and report frames per second.')
+	add_stage_arguments(parser)
+	parser.add_argument('-m', '--method', choices=sorted(methods), default='breadth_first_search')
+	parser.add_argument('-b', '--backend', choices=backends, default='egl', help='offscreen OpenGL platform')
+	parser.add_argument('-s', '--size', default='800x600', help='frame size, WIDTHxHEIGHT')
+	parser.add_argument('-o', '--output', help='directory to write PNG frames to, one folder per stage')
+	args = parser.parse_args(argv)
+
+	size = tuple(int(value) for value in args.size.lower().split('x'))
+	paths = parse_stages(parser, args)
+
+	for path in paths:
+		print(json.dumps(render_stage(path, args.method, args.backend, size, args.output)), flush=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,80 @@
+# coding=utf-8
+import hashlib
+import json
+import os
+
+from level import Level
+from solver import Solver
+from utility import Method
+
+solutions_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'solutions')
+# bump when a solver may return a different path for the same stage, older entries are then ignored
+version = 2
+
+
+class Solutions:
+	# On-disk store of solver results, one small JSON file per (stage file contents, method). Reading an
+	# entry touches its mtime, and put() drops the least recently used entries once the store holds more
+	# than max_bytes.
+	def __init__(self, directory=solutions_directory, max_bytes=4 << 20):
+		self.directory = directory
+		self.max_bytes = max_bytes
+
+	@staticmethod
+	def get_key(path: str, method: int):
+		with open(path, 'rb') as file:
+			digest = hashlib.sha256(file.read()).hexdigest()
+		return '{}-{}-{}'.format(digest, method, version)
+
+	def get_file(self, key: str):
+		return os.path.join(self.directory, key + '.json')
+
+	def get(self, key: str):
+		# the stored record ({'path': moves or None, ...}), None when there is none
+		file_path = self.get_file(key)
+		try:
+			with open(file_path) as file:
+				record = json.load(file)
+			os.utime(file_path)
+			return record
+		except (OSError, ValueError):
+			return None
+
+	def put(self, key: str, record: dict):
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+			temporary = '{}.{}.tmp'.format(self.get_file(key), os.getpid())
+			with open(temporary, 'w') as file:
+				json.dump(record, file)
+			os.replace(temporary, self.get_file(key))
+			self.evict()
+		except OSError:
+			pass
+
+	def evict(self):
+		entries = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith('.json'):
+				stat = entry.stat()
+				entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+		total = sum(size for _, size, _ in entries)
+		for _, size, file_path in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(file_path)
+			except OSError:
+				pass
+			total -= size
+
+	def solve(self, path: str, method=Method.breadth_first_search, level: Level = None):
+		# returns the moves that solve the stage file (None when there is no solution) and whether
+		# they came from the store
+		key = self.get_key(path, method)
+		record = self.get(key)
+		if record is not None:
+			return record['path'], True
+
+		moves, states = Solver.run(level or Level.load(path), method)
+		self.put(key, {'path': moves, 'states': states})
+		return moves, False
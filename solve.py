@@ -0,0 +1,122 @@
+# coding=utf-8
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from multiprocessing import Pool
+
+from level import Level, stages_directory
+from solutions import Solutions
+from solver import Solver
+from stats import Stats
+from utility import Method
+
+methods = {name: value for name, value in vars(Method).items() if not name.startswith('_')}
+
+
+def peak_rss():
+	# peak resident set size of this process in MB
+	try:
+		import resource
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+	except ImportError:
+		import psutil
+		return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def stage_number(path: str):
+	match = re.search(r'stage_(\d+)\.txt$', path)
+	return int(match.group(1)) if match else -1
+
+
+def find_stages(patterns, directory: str):
+	# every pattern is a stage number, a range such as 10-20, or a file glob inside the directory
+	paths = set()
+	for pattern in patterns or ['stage_*.txt']:
+		match = re.fullmatch(r'(\d+)(?:-(\d+))?', pattern)
+		if match:
+			first = int(match.group(1))
+			last = int(match.group(2) or first)
+			for number in range(first, last + 1):
+				path = os.path.join(directory, 'stage_{}.txt'.format(number))
+				if os.path.exists(path):
+					paths.add(path)
+		else:
+			paths.update(glob.glob(os.path.join(directory, pattern)))
+	return sorted(paths, key=lambda path: (stage_number(path), path))
+
+
+def add_stage_arguments(parser: argparse.ArgumentParser):
+	# the stage patterns and stages directory every command line tool takes, see parse_stages
+	parser.add_argument('stages', nargs='*', help='stage numbers, ranges (10-20) or globs (stage_2*.txt)')
+	parser.add_argument('-d', '--directory', default=stages_directory, help='stages directory')
+
+
+def parse_stages(parser: argparse.ArgumentParser, args: argparse.Namespace):
+	# the stage files matching the arguments of add_stage_arguments, exits with a usage error when there are none
+	paths = find_stages(args.stages, args.directory)
+	if not paths:
+		parser.error('no stage matches {}'.format(' '.join(args.stages) or 'stage_*.txt'))
+	return paths
+
+
+def solve_stage(job):
+	path, method, counted, cached = job
+	result = {'stage': stage_number(path), 'file': os.path.basename(path), 'method': method}
+	try:
+		solutions = Solutions() if cached else None
+		if solutions is not None:
+			key = solutions.get_key(path, methods[method])
+			# --stats needs a real search, a stored solution has no counters
+			record = solutions.get(key) if not counted else None
+			if record is not None:
+				result.update(record)
+				result['length'] = len(record['path']) if record['path'] is not None else None
+				result['cached'] = True
+				return result
+
+		level = Level.load(path)
+		stats = Stats() if counted else None
+		start = time.perf_counter()
+		moves, states = Solver.run(level, methods[method], stats)
+		total = (time.perf_counter() - start) * 1000
+		if solutions is not None:
+			solutions.put(key, {'path': moves, 'states': states})
+		result.update({
+			'path': moves,
+			'length': len(moves) if moves is not None else None,
+			'states': states,
+			'time_ms': round(total, 3),
+			'peak_rss_mb': round(peak_rss(), 3),
+		})
+		if stats is not None:
+			result['stats'] = stats.as_dict()
+	except Exception as error:
+		# reported like parallel.work, the other stages go on
+		result['error'] = repr(error)
+	return result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Solve Bloxorz stages and print one JSON line per stage.')
+	add_stage_arguments(parser)
+	parser.add_argument('-m', '--method', choices=sorted(methods), default='breadth_first_search')
+	parser.add_argument('-j', '--processes', type=int, default=os.cpu_count(), help='worker processes')
+	parser.add_argument('-s', '--stats', action='store_true', help='count expanded, generated and pruned nodes')
+	parser.add_argument('--no-cache', action='store_true', help='solve again even when a solution is stored')
+	args = parser.parse_args(argv)
+
+	jobs = [(path, args.method, args.stats, not args.no_cache) for path in parse_stages(parser, args)]
+
+	# one stage per worker process, so peak RSS is measured per stage
+	with Pool(processes=min(args.processes, len(jobs)), maxtasksperchild=1) as pool:
+		for result in pool.imap_unordered(solve_stage, jobs):
+			print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -1,71 +1,508 @@
 # coding=utf-8
-from state import State
-from utility import Direction
+import heapq
+from collections import deque
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from level import Level, split_actions
+from stats import Stats
+from utility import Cell, Method
+from visited import get_visited
+
+if TYPE_CHECKING:
+	from state import State
+
+
+def rolls(distance: int):
+	# a roll moves each cube of the block at most 2 tiles along one axis
+	return (distance + 1) // 2
+
+
+def manhattan(a, b):
+	return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+class Heuristic:
+	# Admissible lower bound on the number of moves left to stand on the goal: the Manhattan distance
+	# from the farthest cube to the goal divided by the per-roll progress, minimised over reaching the
+	# goal directly or through any chain of teleporters. On levels without teleporters, a block cut
+	# off from the goal by the current bridges must first press a switch, which adds a detour.
+
+	def __init__(self, level: Level):
+		self.goal = level.goal
+		positions = [(index % level.width, index // level.width) for index in range(level.width * level.height)]
+		self.triggers = {}
+		for index, teleport in enumerate(level.teleport):
+			if teleport >= 0:
+				x0, y0, x1, y1 = level.teleports[teleport]
+				self.triggers[positions[index]] = ((x0, y0), (x1, y1))
+		self.switches = [positions[index] for index, switch in enumerate(level.hard_switch) if switch >= 0]
+
+		# cost from the cubes dropped by a teleporter to the goal, relaxed over teleporter chains
+		self.after_teleport = {
+			trigger: rolls(max(manhattan(target, self.goal) for target in targets))
+			for trigger, targets in self.triggers.items()
+		} if self.goal is not None else {}
+		for _ in range(len(self.triggers)):
+			for trigger, targets in self.triggers.items():
+				for other, cost in self.after_teleport.items():
+					via = rolls(max(manhattan(target, other) for target in targets)) + cost
+					if via < self.after_teleport[trigger]:
+						self.after_teleport[trigger] = via
+
+		self.floor = {positions[index] for index, cell in enumerate(level.cells) if cell != Cell.empty}
+		self.bridge_bits = {positions[index]: bit for index, bit in enumerate(level.bridge_bit) if bit}
+		self.components = {}
+
+	def to_goal(self, cells):
+		best = rolls(max(manhattan(cell, self.goal) for cell in cells))
+		for trigger, cost in self.after_teleport.items():
+			best = min(best, rolls(max(manhattan(cell, trigger) for cell in cells)) + cost)
+		return best
+
+	def goal_component(self, mask: int):
+		# tiles connected to the goal through floor and raised bridges
+		if mask not in self.components:
+			component = {self.goal}
+			queue = deque([self.goal])
+			while queue:
+				x, y = queue.popleft()
+				for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+					if cell in component or cell not in self.floor:
+						continue
+					if cell in self.bridge_bits and not mask & self.bridge_bits[cell]:
+						continue
+					component.add(cell)
+					queue.append(cell)
+			self.components[mask] = component
+		return self.components[mask]
+
+	def estimate(self, x0: int, y0: int, x1: int, y1: int, mask: int):
+		if self.goal is None:
+			return float('inf')
+		cells = [(x0, y0), (x1, y1)]
+		estimate = self.to_goal(cells)
+		if self.triggers or not self.switches:
+			return estimate
+
+		component = self.goal_component(mask)
+		if all(cell in component for cell in cells):
+			return estimate
+
+		detour = min(
+			rolls(min(manhattan(cell, switch) for cell in cells)) + rolls(manhattan(switch, self.goal))
+			for switch in self.switches
+		)
+		return max(estimate, detour)
 
 
 class Solver:
-	# Simple Depth First Search to calculate time
+	# Shared frontier loop over the Level transition table (Level.successors, inlined): pops from the
+	# right (stack) or the left (queue) and returns the goal key with the parent pointer of every
+	# discovered key
 	@staticmethod
-	def dfs(state: State):
-		while state.states:
-			player, bridge = state.states.pop()
-			state.load_state(player, bridge)
+	def search(level: Level, start: int, depth_first: bool, stats: Stats = None):
+		if stats is not None:
+			return Solver.counted_search(level, start, depth_first, stats)
 
-			for direction in ['up', 'down', 'left', 'right']:
-				if state.move(direction, False):
-					if state.found:
-						return
+		masks, goal = level.masks, level.goal_config
+		next_config, need, effect, effects = level.next_config, level.need, level.effect, level.effects
+		states = deque([start])
+		visited = {start: None}
+		pop = states.pop if depth_first else states.popleft
+		while states:
+			key = pop()
+			config, mask = divmod(key, masks)
+			base = config * 5
+			for index in range(base, base + 5):
+				target = next_config[index]
+				if target < 0 or need[index] & ~mask:
+					continue
 
-			if state.get_direction(state.player) == Direction.none:
-				state.move('swap', False)
+				if effect[index] >= 0:
+					and_mask, xor_mask = effects[effect[index]]
+					child = target * masks + ((mask & and_mask) ^ xor_mask)
+				else:
+					child = target * masks + mask
+
+				if child not in visited:
+					visited[child] = (key, split_actions[index - base])
+					if target == goal:
+						return child, visited
+					states.append(child)
+		return None, visited
+
+	# Same search and result as above with every step counted into stats. Kept apart so the
+	# uncounted loop above pays nothing for the instrumentation.
+	@staticmethod
+	def counted_search(level: Level, start: int, depth_first: bool, stats: Stats):
+		masks, goal = level.masks, level.goal_config
+		next_config, need, effect, effects = level.next_config, level.need, level.effect, level.effects
+		clock = Stats.clock
+		states = deque([start])
+		visited = {start: None}
+		pop = states.pop if depth_first else states.popleft
+		while states:
+			stats.expand(len(states))
+			began = clock()
+			key = pop()
+			config, mask = divmod(key, masks)
+			base = config * 5
+			children = []
+			for index in range(base, base + 5):
+				target = next_config[index]
+				if target < 0 or need[index] & ~mask:
+					if target != Level.no_action:
+						stats.invalid += 1
+					continue
+
+				if effect[index] >= 0:
+					and_mask, xor_mask = effects[effect[index]]
+					children.append((target * masks + ((mask & and_mask) ^ xor_mask), target, index - base))
+				else:
+					children.append((target * masks + mask, target, index - base))
+
+			looked = clock()
+			stats.successor_ns += looked - began
+			stats.generated += len(children)
+			for child, target, action in children:
+				if child in visited:
+					stats.duplicates += 1
+					continue
+
+				visited[child] = (key, split_actions[action])
+				if target == goal:
+					stats.lookup_ns += clock() - looked
+					return child, visited
+				states.append(child)
+			stats.lookup_ns += clock() - looked
+		return None, visited
+
+	# Breadth First Search from both ends: forward from the start and backward from the goal tile under
+	# every bridge mask through Level.preimages, one whole layer of the smaller frontier at a time.
+	# The cheapest meeting in the first layer where the two trees touch is a shortest path.
+	@staticmethod
+	def bidirectional_search(level: Level, start: int, stats: Stats = None):
+		if level.is_goal(start):
+			return [], 1
+
+		forward, backward = {start: None}, dict.fromkeys(level.get_goals(start))
+		forward_depth, backward_depth = {start: 0}, dict.fromkeys(backward, 0)
+		forward_layer, backward_layer = [start], list(backward)
+		while forward_layer:
+			if not backward_layer or len(forward_layer) <= len(backward_layer):
+				forward_layer, meet = Solver.expand_layer(
+						forward_layer, level.successors, forward, forward_depth, backward_depth, stats)
+			else:
+				backward_layer, meet = Solver.expand_layer(
+						backward_layer, level.preimages, backward, backward_depth, forward_depth, stats)
+
+			if meet is not None:
+				path = Level.get_path(forward, meet)
+				while backward[meet] is not None:
+					meet, action = backward[meet]
+					path.append(action)
+				return path, len(forward) + len(backward)
+		return None, len(forward) + len(backward)
 
-	# Simple Breadth First Search to calculate time
 	@staticmethod
-	def bfs(state: State):
-		while state.states:
-			player, bridge = state.states.pop(0)
-			state.load_state(player, bridge)
+	def expand_layer(layer, neighbours, tree, depth, other_depth, stats: Stats = None):
+		next_layer = []
+		meet = None
+		for position, key in enumerate(layer):
+			if stats is not None:
+				stats.expand(len(layer) - position + len(next_layer))
+				began = Stats.clock()
 
-			for direction in ['up', 'down', 'left', 'right']:
-				if state.move(direction, False):
-					if state.found:
-						return
+			nodes = neighbours(key, stats)
+			if stats is not None:
+				looked = Stats.clock()
+				stats.successor_ns += looked - began
+				stats.generated += len(nodes)
 
-			if state.get_direction(state.player) == Direction.none:
-				state.move('swap', False)
+			for action, node in nodes:
+				if node in tree:
+					if stats is not None:
+						stats.duplicates += 1
+					continue
+				tree[node] = (key, action)
+				depth[node] = depth[key] + 1
+				next_layer.append(node)
+				if node in other_depth:
+					if meet is None or depth[node] + other_depth[node] < depth[meet] + other_depth[meet]:
+						meet = node
+
+			if stats is not None:
+				stats.lookup_ns += Stats.clock() - looked
+		return next_layer, meet
+
+	# Breadth First Search a whole layer at a time in NumPy: the transition table is looked up for every
+	# key of the layer and all 5 actions at once, np.unique keeps one parent per child, and
+	# visited.get_visited (one bit per key of the level, a hash set when there are more than dense_limit
+	# keys) drops the states seen before. Every layer keeps its keys' actions and parents (as indices
+	# into the previous layer) to walk the path back. Returns the path (None when there is no solution)
+	# and the number of states discovered.
+	@staticmethod
+	def batched_search(level: Level, start: int, stats: Stats = None, dense_limit=1 << 31):
+		if level.is_goal(start):
+			return [], 1
+
+		masks, goal = level.masks, level.goal_config
+		next_config = np.frombuffer(level.next_config, np.int32).reshape(-1, 5)
+		need = np.frombuffer(level.need, np.int64).reshape(-1, 5)
+		effect = np.frombuffer(level.effect, np.int16).reshape(-1, 5)
+		# effect -1 (no switch) picks the last row, which leaves the mask as it is
+		effects = np.array(level.effects + [(-1, 0)], np.int64).reshape(-1, 2)
+		visited = get_visited(level, dense_limit)
+		visited.add(start)
+
+		layer = np.array([start], np.int64)
+		layers = []
+		discovered = 1
+		while layer.size:
+			if stats is not None:
+				stats.expand_layer(layer.size)
+				began = Stats.clock()
+
+			config, mask = np.divmod(layer, masks)
+			targets = next_config[config]
+			valid = (targets >= 0) & (need[config] & ~mask[:, None] == 0)
+			switched = effects[effect[config]]
+			children = targets * masks + ((mask[:, None] & switched[..., 0]) ^ switched[..., 1])
+			parents, actions = np.nonzero(valid)
+			children = children[parents, actions]
+			if stats is not None:
+				looked = Stats.clock()
+				stats.successor_ns += looked - began
+				stats.invalid += int(np.count_nonzero((targets != Level.no_action) & ~valid))
+				generated = children.size
+				stats.generated += generated
+
+			# the first parent of every child, the children sorted
+			children, first = np.unique(children, return_index=True)
+			new = ~visited.contains(children)
+			children = children[new]
+			visited.update(children)
+			first = first[new]
+			layers.append((parents[first].astype(np.int32), actions[first].astype(np.int8)))
+			discovered += children.size
+			if stats is not None:
+				stats.duplicates += generated - children.size
+				stats.lookup_ns += Stats.clock() - looked
+
+			reached = np.flatnonzero(children // masks == goal)
+			if reached.size:
+				index = int(reached[0])
+				path = []
+				for parents, actions in reversed(layers):
+					path.append(split_actions[actions[index]])
+					index = int(parents[index])
+				return path[::-1], discovered
+			layer = children
+		return None, discovered
+
+	# A* over the same successors, ordered by moves so far plus Heuristic.estimate.
+	# States are re-opened when a shorter path is found, so the returned path is optimal.
+	@staticmethod
+	def informed_search(level: Level, start: int, stats: Stats = None, heuristic=None):
+		# heuristic: anything with Heuristic.estimate, such as a distances.Distances table
+		heuristic = heuristic or Heuristic(level)
+		cost = {start: 0}
+		visited = {start: None}
+		queue = [(heuristic.estimate(*level.decode(start)), 0, start)]
+		while queue:
+			_, depth, key = heapq.heappop(queue)
+			depth = -depth
+			if depth > cost[key]:
+				continue
+
+			if level.is_goal(key):
+				return key, visited
+
+			if stats is not None:
+				stats.expand(len(queue) + 1)
+				began = Stats.clock()
+
+			children = level.successors(key, stats)
+			if stats is not None:
+				looked = Stats.clock()
+				stats.successor_ns += looked - began
+				stats.generated += len(children)
+
+			for action, child in children:
+				if child not in cost or depth + 1 < cost[child]:
+					cost[child] = depth + 1
+					visited[child] = (key, action)
+					estimate = heuristic.estimate(*level.decode(child))
+					heapq.heappush(queue, (depth + 1 + estimate, -(depth + 1), child))
+				elif stats is not None:
+					stats.duplicates += 1
+
+			if stats is not None:
+				stats.lookup_ns += Stats.clock() - looked
+		return None, visited
+
+	# Iterative deepening A*: depth-first searches cut off where moves so far plus an estimate exceed a
+	# bound, the bound raised to the smallest value that exceeded it until the goal is found, so the
+	# path is optimal. Memory is the current path plus a transposition table of at most table_size
+	# states, holding the round and the least moves each was reached with (to skip worse repeats), and
+	# its estimate. When a state's successors are done, its estimate is raised to one more than the
+	# least of theirs, which stays a lower bound, so later rounds cut it off sooner. A full table drops
+	# the entries of older rounds and then the deepest ones. A shortest path never repeats a key, so a
+	# bound above the number of keys means the goal can't be reached. Returns the path (None when there
+	# is no solution) and the number of expansions.
+	@staticmethod
+	def iterative_deepening(level: Level, start: int, stats: Stats = None, table_size=1 << 16, heuristic=None):
+		heuristic = heuristic or Heuristic(level)
+		if level.is_goal(start):
+			return [], 1
+
+		infinity = float('inf')
+		table = {start: (0, 0, heuristic.estimate(*level.decode(start)))}
+		bound = table[start][2]
+		expanded = 0
+		round_number = 0
+		limit = level.get_size()
+		while bound <= limit:
+			round_number += 1
+			next_bound = infinity
+			path = [start]
+			actions = []
+			on_path = {start}
+			# per state on the path: its successors left to try, and the least of their estimates
+			stack = [[iter(level.successors(start, stats)), infinity]]
+			expanded += 1
+			while stack:
+				frame = stack[-1]
+				step = next(frame[0], None)
+				if step is None:
+					stack.pop()
+					key = path.pop()
+					on_path.discard(key)
+					entry = table.get(key)
+					estimate = max(entry[2], frame[1] + 1) if entry is not None else frame[1] + 1
+					if entry is not None:
+						table[key] = (entry[0], entry[1], estimate)
+					if stack:
+						actions.pop()
+						stack[-1][1] = min(stack[-1][1], estimate)
+					continue
+
+				action, child = step
+				depth = len(path)
+				if stats is not None:
+					stats.generated += 1
+				entry = table.get(child)
+				estimate = entry[2] if entry is not None else heuristic.estimate(*level.decode(child))
+				if child in on_path or (entry is not None and entry[0] == round_number and entry[1] <= depth):
+					frame[1] = min(frame[1], estimate)
+					if stats is not None:
+						stats.duplicates += 1
+					continue
+
+				if depth + estimate > bound:
+					frame[1] = min(frame[1], estimate)
+					next_bound = min(next_bound, depth + estimate)
+					continue
+				if level.is_goal(child):
+					return actions + [action], expanded
+
+				if entry is None and len(table) >= table_size:
+					# oldest rounds first, then the deepest states, they are the cheapest to find again
+					victims = sorted(table, key=lambda key: (table[key][0] == round_number, -table[key][1]))
+					for key in victims[:len(table) // 2 + 1]:
+						del table[key]
+				table[child] = (round_number, depth, estimate)
+				if stats is not None:
+					stats.expand(len(path))
+				expanded += 1
+				path.append(child)
+				actions.append(action)
+				on_path.add(child)
+				stack.append([iter(level.successors(child, stats)), infinity])
+			bound = next_bound
+		return None, expanded
+
+	# Simple Depth First Search to calculate time
+	@staticmethod
+	def dfs(state: 'State', stats: Stats = None):
+		Solver.search(state.level, state.level.start, True, stats)
+
+	# Simple Breadth First Search to calculate time
+	@staticmethod
+	def bfs(state: 'State', stats: Stats = None):
+		Solver.search(state.level, state.level.start, False, stats)
+
+	# Hill Climbing (A*) to calculate time
+	@staticmethod
+	def hill_climbing(state: 'State', stats: Stats = None):
+		Solver.informed_search(state.level, state.level.start, stats)
 
 	# Depth First Search with path to visualize
 	@staticmethod
-	def dfs_path(state: State):
-		move_stack = []
-		while state.states:
-			player, bridge = state.states.pop()
-			move = move_stack.pop() if len(move_stack) > 0 else []
-			state.load_state(player, bridge)
-			for direction in ['up', 'down', 'left', 'right']:
-				if state.move(direction, False):
-					if state.found:
-						return move + [direction]
-					move_stack.append(move + [direction])
-
-			if state.get_direction(state.player) == Direction.none:
-				if state.move('swap', False):
-					move_stack.append(move + ['swap'])
+	def dfs_path(state: 'State', stats: Stats = None):
+		goal, visited = Solver.search(state.level, state.level.start, True, stats)
+		if goal is not None:
+			return Level.get_path(visited, goal)
 
 	# Breadth First Search with path to visualize
 	@staticmethod
-	def bfs_path(state: State):
-		move_queue = []
-		while state.states:
-			player, bridge = state.states.pop(0)
-			move = move_queue.pop(0) if len(move_queue) > 0 else []
-			state.load_state(player, bridge)
-			for direction in ['up', 'down', 'left', 'right']:
-				if state.move(direction, False):
-					if state.found:
-						return move + [direction]
-					move_queue.append(move + [direction])
-
-			if state.get_direction(state.player) == Direction.none:
-				if state.move('swap', False):
-					move_queue.append(move + ['swap'])
+	def bfs_path(state: 'State', stats: Stats = None):
+		goal, visited = Solver.search(state.level, state.level.start, False, stats)
+		if goal is not None:
+			return Level.get_path(visited, goal)
+
+	# Hill Climbing (A*) with path to visualize
+	@staticmethod
+	def hill_climbing_path(state: 'State', stats: Stats = None):
+		goal, visited = Solver.informed_search(state.level, state.level.start, stats)
+		if goal is not None:
+			return Level.get_path(visited, goal)
+
+	# Bidirectional Breadth First Search to calculate time
+	@staticmethod
+	def bidirectional(state: 'State', stats: Stats = None):
+		Solver.bidirectional_search(state.level, state.level.start, stats)
+
+	# Bidirectional Breadth First Search with path to visualize
+	@staticmethod
+	def bidirectional_path(state: 'State', stats: Stats = None):
+		return Solver.bidirectional_search(state.level, state.level.start, stats)[0]
+
+	# Iterative deepening A* to calculate time
+	@staticmethod
+	def iterative_deepening_run(state: 'State', stats: Stats = None):
+		Solver.iterative_deepening(state.level, state.level.start, stats)
+
+	# Iterative deepening A* with path to visualize
+	@staticmethod
+	def iterative_deepening_path(state: 'State', stats: Stats = None):
+		return Solver.iterative_deepening(state.level, state.level.start, stats)[0]
+
+	# Layered NumPy Breadth First Search to calculate time
+	@staticmethod
+	def batched_run(state: 'State', stats: Stats = None):
+		Solver.batched_search(state.level, state.level.start, stats)
+
+	# Layered NumPy Breadth First Search with path to visualize
+	@staticmethod
+	def batched_path(state: 'State', stats: Stats = None):
+		return Solver.batched_search(state.level, state.level.start, stats)[0]
+
+	# Solve from the level's start with the given utility.Method, returning the path (None when
+	# there is no solution) and the number of states discovered (expanded for iterative deepening)
+	@staticmethod
+	def run(level: Level, method: int, stats: Stats = None):
+		if method == Method.bidirectional_search:
+			return Solver.bidirectional_search(level, level.start, stats)
+		if method == Method.iterative_deepening:
+			return Solver.iterative_deepening(level, level.start, stats)
+		if method == Method.batched_breadth_first_search:
+			return Solver.batched_search(level, level.start, stats)
+
+		if method == Method.hill_climbing:
+			goal, visited = Solver.informed_search(level, level.start, stats)
+		else:
+			goal, visited = Solver.search(level, level.start, method == Method.depth_first_search, stats)
+		return (Level.get_path(visited, goal) if goal is not None else None), len(visited)
@@ -6,7 +6,8 @@ import numpy as np
 from OpenGL.GL import glLineWidth, glPopMatrix, glPushMatrix, glRotate, glTranslate
 
 from draw import Draw
-from utility import Direction, Tile
+from level import Block, load_stage, stage_path, stages_directory
+from utility import Cell, Direction, Tile
 
 # Nothing:			---
 # Heavy/Soft Floor:	ooo|iii
@@ -16,68 +17,59 @@ from utility import Direction, Tile
 # Bridges:			(On|off)			(up|down|left|right)	[id] 					- [B|b]	(0|1|2)	[0-9]
 # Teleport:			t					[id]					(trigger|first|second) 	- t		[0-9]	(t|0|1)
 
-rotating_speed = 15
+# degrees per second of a rolling block, 15 per frame at 60 fps
+rotating_speed = 900
 
 
 class State:
 
-	def __init__(self, stage=1):
+	def __init__(self, stage=1, directory=stages_directory):
 		self.steps = 0
 		self.degree = 0
-		self.found = False
+		# length of the last frame in ms, animations advance by it rather than by a fixed step per frame
+		self.delta = 1000 / 60
 		self.bridges = {}
 		self.switches = {}
 		self.teleporter = {}
-		self.player = np.array([])
-		self.board = self.load_level(stage)
+		self.goal = None
+		self.player: Block = None
+		self.path = ''
+		self.board = self.load_level(stage, directory)
+		self.mask = self.get_bridges_mask(self.board)
+		self.features = self.get_features(self.board)
+		# display lists of the static tiles and of the tiles of every bridge bit, built on the first draw
+		self.level_list = 0
+		self.bridge_lists = {}
+		self.drawn_mask = 0
+		# Draw.angle_stepsize the switches in the lists were tessellated with
+		self.drawn_quality = Draw.angle_stepsize
 		self.previous = self.player
 
 		if not self.is_valid(self.player):
 			print('Invalid starting position')
 			sys.exit()
 
-		self.states = [(self.player.tolist(), self.get_bridges_status(self.board))]
-		self.visited = [(self.player.tolist(), self.get_bridges_status(self.board))]
+		self.start = (self.player, self.get_bridges_status(self.board))
 		self.move_direction = 'none'
 
 	# self.eval_map = None
 
-	@staticmethod
-	def check_goal(player: np.ndarray, board: np.ndarray):
-		return np.array_equal(player[0], player[1]) and board[player[0, 1], player[0, 0]] == Tile.goal
+	def check_goal(self, player: Block):
+		x0, y0, x1, y1 = player
+		return x0 == x1 and y0 == y1 and self.level.cells[y0 * self.level.width + x0] == Cell.goal
 
 	@staticmethod
-	def get_direction(player: np.ndarray):
-		diff = player[1] - player[0]
-		if diff[0] == 0 and diff[1] == 0:
-			return Direction.standing
-		elif (diff[0] == 1 or diff[0] == -1) and diff[1] == 0:
-			return Direction.laying_x
-		elif (diff[1] == 1 or diff[1] == -1) and diff[0] == 0:
-			return Direction.laying_y
-		else:
-			return Direction.none
+	def get_direction(player: Block):
+		return player.get_direction()
 
 	def is_in_bound(self, x: int, y: int):
-		height, width = self.board.shape
-		return 0 <= x < width and 0 <= y < height
+		return 0 <= x < self.level.width and 0 <= y < self.level.height
 
 	def is_empty_floor(self, x: int, y: int):
-		tile = str(self.board[y, x])
-		return tile == Tile.empty or tile.startswith('b')
+		return not self.level.is_floor(x, y, self.mask)
 
-	def is_valid(self, player: np.ndarray):
-		block1, block2 = player
-		if not self.is_in_bound(*block1) or not self.is_in_bound(*block2):
-			return False
-
-		if self.is_empty_floor(*block1) or self.is_empty_floor(*block2):
-			return False
-
-		if np.array_equal(block1, block2):
-			tile = str(self.board[block1[1], block1[0]])
-			return tile != Tile.soft_floor
-		return True
+	def is_valid(self, player: Block):
+		return self.level.is_valid(*player, self.mask)
 
 	def activate_bridge(self, bridge_id: str, board: np.ndarray, mode=1):
 		mode = int(mode)
@@ -94,17 +86,18 @@ class State:
 
 		return board
 
-	def check_switch(self, player: np.ndarray):
+	def check_switch(self, player: Block):
 		direction = self.get_direction(player)
-		block1 = tuple(player[0])
-		block2 = tuple(player[1])
+		block1 = player.first
+		block2 = player.second
 		board = np.copy(self.board)
 
 		if direction == Direction.standing:
 			if block1 in self.switches:
 				for switch in self.switches[block1]:
 					if switch[0] == 't':
-						player = np.array(self.teleporter[switch])
+						(x0, y0), (x1, y1) = self.teleporter[switch]
+						player = Block(x0, y0, x1, y1)
 					else:
 						board = self.activate_bridge(switch[2], board, switch[1])
 		else:
@@ -119,83 +112,41 @@ class State:
 						board = self.activate_bridge(switch[2], board, switch[1])
 		return player, board
 
-	def check_merge(self, player: np.ndarray):
-		diff = player[1] - player[0]
+	def check_merge(self, player: Block):
 		direction = self.get_direction(player)
-		if (direction == Direction.laying_x and diff[0] == -1) or (direction == Direction.laying_y and diff[1] == -1):
+		if (direction == Direction.laying_x and player.x1 - player.x0 == -1) or \
+				(direction == Direction.laying_y and player.y1 - player.y0 == -1):
 			return True
 		return False
 
 	def try_move(self, action: str):
-		player = np.copy(self.player)
-		direction = self.get_direction(player)
-
-		if direction == Direction.standing:
-			if action == 'up':
-				player[:, 1] -= [2, 1]
-			elif action == 'down':
-				player[:, 1] += [1, 2]
-			elif action == 'left':
-				player[:, 0] -= [2, 1]
-			elif action == 'right':
-				player[:, 0] += [1, 2]
-		elif direction == Direction.laying_x:
-			if action == 'up':
-				player[:, 1] -= [1, 1]
-			elif action == 'down':
-				player[:, 1] += [1, 1]
-			elif action == 'left':
-				player[:, 0] -= [1, 2]
-			elif action == 'right':
-				player[:, 0] += [2, 1]
-		elif direction == Direction.laying_y:
-			if action == 'up':
-				player[:, 1] -= [1, 2]
-			elif action == 'down':
-				player[:, 1] += [2, 1]
-			elif action == 'left':
-				player[:, 0] -= [1, 1]
-			elif action == 'right':
-				player[:, 0] += [1, 1]
-		else:
-			if action == 'up':
-				player[0, 1] -= 1
-			elif action == 'down':
-				player[0, 1] += 1
-			elif action == 'left':
-				player[0, 0] -= 1
-			elif action == 'right':
-				player[0, 0] += 1
-			elif action == 'swap':
-				player[[0, 1], :] = player[[1, 0], :]
-				self.degree = 90
-
-		return player
+		# swapping only switches the halves of a split block, the other moves roll as in Level.roll
+		if action == 'swap':
+			if self.get_direction(self.player) != Direction.none:
+				return self.player
+			self.degree = 90
+			return self.player.swapped()
+		return self.player.roll(action)
 
-	def move(self, action: str, commit=True):
-		self.previous = np.copy(self.player)
+	def get_successor(self, action: str):
 		player = self.try_move(action)
+		if not self.is_valid(player):
+			return None
 
-		if self.is_valid(player):
-			if action != 'swap':
-				player, board = self.check_switch(player)
-			else:
-				board = self.board
-
-			if commit:
-				self.board = board
-				self.player = player
-				self.move_direction = action
-				return True
-			else:
-				if self.check_merge(player):
-					player[[0, 1], :] = player[[1, 0], :]
+		if action != 'swap':
+			return self.check_switch(player)
+		return player, self.board
 
-				if self.check_goal(player, board):
-					self.found = True
-				return self.add_state(player, board)
+	def move(self, action: str):
+		self.previous = self.player
+		successor = self.get_successor(action)
+		if successor is None:
+			return False
 
-		return False
+		self.player, self.board = successor
+		self.mask = self.get_bridges_mask(self.board)
+		self.move_direction = action
+		return True
 
 	# region Utils
 	def get_bridges_status(self, board: np.ndarray):
@@ -205,16 +156,21 @@ class State:
 			result.append((key, board[y, x][0]))
 		return result
 
-	def add_state(self, player: np.ndarray, board: np.ndarray):
-		data = (player.tolist(), self.get_bridges_status(board))
-		if data not in self.visited:
-			self.visited.append(data)
-			self.states.append(data)
-			return True
-		return False
-
-	def load_state(self, player, bridges: List[Tuple[str, str]]):
-		self.player = np.array(player)
+	def get_bridges_mask(self, board: np.ndarray):
+		# one bit per bridge id (in load order), set when the bridge is up
+		mask = 0
+		for bit, positions in enumerate(self.bridges.values()):
+			x, y = positions[0]
+			if str(board[y, x]).startswith('B'):
+				mask |= 1 << bit
+		return mask
+
+	def encode(self, player: Block, board: np.ndarray):
+		# pack (x0, y0, x1, y1, bridge mask) into the level's key
+		return self.level.encode(*player, self.get_bridges_mask(board))
+
+	def load_state(self, player: Block, bridges: List[Tuple[str, str]]):
+		self.player = player
 		for bridge in bridges:
 			# bridges = [('1', 'b'), ('2', 'B'), ('0', 'B')]
 			# bridge = ('1', 'b')
@@ -226,51 +182,18 @@ class State:
 				x, y = pos
 				text = self.board[y, x]
 				self.board[y, x] = bridge[1] + text[1:]
-
-	def load_level(self, number: int):
-		with open('C:/Users/Administrator/Desktop/Bloxorz-master/Stages/stage_{}.txt'.format(number)) as file:
-			level = []
-			for y, line in enumerate(file):
-				if line.strip():
-					row = [c for c in line.split() if c]
-					level.append(row)
-					for x, cell in enumerate(row):
-						for i in range(0, len(cell), 3):
-							# for every 3 characters
-							feature = cell[i:i + 3]
-							first_char = feature[0]
-							if first_char == 'b' or first_char == 'B':
-								bridge_id = feature[2]
-								if bridge_id in self.bridges:
-									self.bridges[bridge_id].append((x, y))
-								else:
-									self.bridges[bridge_id] = [(x, y)]
-							elif first_char == 's' or first_char == 'S':
-								if (x, y) in self.switches:
-									self.switches[(x, y)].append(feature)
-								else:
-									self.switches[(x, y)] = [feature]
-							elif first_char == 't':
-								if feature[2] != 't':
-									# { 't[0-9]t': [ t[0-9][0-1] ] }
-									trigger_id = 't' + feature[1] + 't'
-									if trigger_id in self.teleporter:
-										position = int(feature[2])
-										self.teleporter[trigger_id][position:position] = [[x, y]]
-									else:
-										self.teleporter[trigger_id] = [[x, y]]
-								else:
-									if (x, y) in self.switches:
-										self.switches[(x, y)].append(feature)
-									else:
-										self.switches[(x, y)] = [feature]
-							elif feature == 'PPP':
-								self.player = np.array([[x, y], [x, y]])
-
+		self.mask = self.get_bridges_mask(self.board)
+
+	def load_level(self, number: int, directory: str):
+		self.path = stage_path(number, directory)
+		layout, self.level = load_stage(self.path)
+		level, self.bridges, self.switches, self.teleporter, start, self.goal = layout
+		if start is not None:
+			self.player = Block(start[0], start[1], start[0], start[1])
 		return np.array(level)
 
 	def restart(self):
-		self.load_state(*self.visited[0])
+		self.load_state(*self.start)
 		self.previous = self.player
 	# endregion
 
@@ -301,20 +224,60 @@ class State:
 			else:
 				Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['white'])
 
-	def draw_level(self):
-		height, width = self.board.shape
-
+	def get_features(self, board: np.ndarray):
+		# split every tile once into its 3 character features, with the bridge bit of bridge tiles
+		features = []
+		height, width = board.shape
 		for x in range(width):
 			for y in range(height):
-				tile = str(self.board[y][x])
-				if len(tile) > 3:
-					# if there's more than 3 characters
-					for i in range(0, len(tile), 3):
-						# for every 3 characters
-						feature = tile[i:i + 3]
-						self.draw_feature(feature, x, y)
-				else:
-					self.draw_feature(tile, x, y)
+				tile = str(board[y][x])
+				bit = self.level.bridge_bit[y * width + x]
+				for i in range(0, len(tile), 3):
+					# for every 3 characters
+					feature = tile[i:i + 3]
+					if feature != Tile.empty:
+						features.append((x, y, feature, bit))
+		return features
+
+	def draw_features(self, bit: int, mask: int):
+		# draw the tiles of one bridge bit, or every tile that isn't a bridge when bit is 0
+		for x, y, feature, feature_bit in self.features:
+			if feature_bit == bit:
+				if bit:
+					feature = ('B' if mask & bit else 'b') + feature[1:]
+				self.draw_feature(feature, x, y)
+
+	def draw_level(self):
+		# the level is baked into display lists once, and a bridge's list is rebuilt only when its bit
+		# changes, so a frame is one glCallList per bridge plus one for everything else. Draw.set_quality
+		# bakes them again.
+		if self.level_list and self.drawn_quality != Draw.angle_stepsize:
+			self.delete_lists()
+		if not self.level_list:
+			self.level_list = Draw.compile(lambda: self.draw_features(0, 0))
+			for bit in sorted({bit for _, _, _, bit in self.features if bit}):
+				self.bridge_lists[bit] = Draw.compile(lambda: self.draw_features(bit, self.mask))
+			self.drawn_mask = self.mask
+			self.drawn_quality = Draw.angle_stepsize
+		elif self.mask != self.drawn_mask:
+			changed = self.mask ^ self.drawn_mask
+			for bit, display_list in self.bridge_lists.items():
+				if changed & bit:
+					Draw.compile(lambda: self.draw_features(bit, self.mask), display_list)
+			self.drawn_mask = self.mask
+
+		Draw.call(self.level_list)
+		for display_list in self.bridge_lists.values():
+			Draw.call(display_list)
+
+	def delete_lists(self):
+		# frees the display lists on the current context, the next draw_level bakes them again
+		if self.level_list:
+			Draw.delete(self.level_list)
+		for display_list in self.bridge_lists.values():
+			Draw.delete(display_list)
+		self.level_list = 0
+		self.bridge_lists = {}
 
 	@staticmethod
 	def draw_main_cube(block: Tuple[int, int], direction: int):
@@ -332,18 +295,23 @@ class State:
 		if direction == Direction.none:
 			Draw.draw_cube(position=block, size=(1, 1, 1), face_color=Draw.colors['light_gray'])
 
+	def get_speed(self):
+		# degrees to turn in this frame
+		return rotating_speed * self.delta / 1000
+
 	def rotate_player(self):
-		current = self.player
-		[x_diff, y_diff] = current[0] - self.previous[0]
-		x_center = self.previous[0, 0] + x_diff if x_diff > 0 else self.previous[0, 0]
-		y_center = self.previous[0, 1] + y_diff if y_diff > 0 else self.previous[0, 1]
-		if self.degree + rotating_speed >= 90:
+		previous = self.previous
+		x_diff, y_diff = self.player.x0 - previous.x0, self.player.y0 - previous.y0
+		x_center = previous.x0 + x_diff if x_diff > 0 else previous.x0
+		y_center = previous.y0 + y_diff if y_diff > 0 else previous.y0
+		speed = self.get_speed()
+		if self.degree + speed >= 90:
 			self.degree = 90
 			if self.check_merge(self.player):
-				self.player[[0, 1], :] = self.player[[1, 0], :]
+				self.player = self.player.swapped()
 		else:
-			self.degree += rotating_speed
-		if (current - self.previous).tolist() != [[0, 0], [0, 0]]:
+			self.degree += speed
+		if self.player != previous:
 			glTranslate(x_center, -y_center, 0)
 			glRotate(self.degree, y_diff, x_diff, 0)
 			glTranslate(-x_center, y_center, 0)
@@ -353,7 +321,7 @@ class State:
 		return False
 
 	def rotate_before_swap(self):
-		x_center, y_center = self.previous[0]
+		x_center, y_center = self.previous.first
 		x_diff, y_diff = 0, 0
 		if self.move_direction == 'up':
 			y_diff = -2
@@ -371,10 +339,11 @@ class State:
 			glTranslate(-x_center, y_center, 0)
 			return False
 
-		if self.degree + rotating_speed >= 90:
+		speed = self.get_speed()
+		if self.degree + speed >= 90:
 			self.degree = 90
 		else:
-			self.degree += rotating_speed
+			self.degree += speed
 
 		glTranslate(x_center, -y_center, 0)
 		glRotate(self.degree, y_diff, x_diff, 0)
@@ -401,28 +370,28 @@ class State:
 		glPushMatrix()
 
 		if self.degree == 90:
-			if not self.check_goal(self.player, self.board):
+			if not self.check_goal(self.player):
 				direction = self.get_direction(self.player)
-				self.draw_main_cube(self.player[0], direction)
-				self.draw_secondary_cube(self.player[1], direction)
+				self.draw_main_cube(self.player.first, direction)
+				self.draw_secondary_cube(self.player.second, direction)
 		else:
 			direction = self.get_direction(self.previous)
-			self.draw_secondary_cube(self.player[1], direction)
+			self.draw_secondary_cube(self.player.second, direction)
 			if direction != Direction.none and self.get_direction(self.player) == Direction.none:
-				done = self.teleport_player(10, rotating_speed / 2)
+				done = self.teleport_player(10, self.get_speed() / 2)
 				if self.rotate_before_swap():
 					if not done:
 						self.steps = 1
 						self.degree = 0
-			elif self.check_goal(self.player, self.board):
-				done = self.teleport_player(-10, rotating_speed / 5)
+			elif self.check_goal(self.player):
+				done = self.teleport_player(-10, self.get_speed() / 5)
 				if self.rotate_before_swap():
 					if not done:
 						self.steps = 1
 						self.degree = 0
 			else:
 				self.rotate_player()
-			self.draw_main_cube(self.previous[0], direction)
+			self.draw_main_cube(self.previous.first, direction)
 		glPopMatrix()
 		glLineWidth(1)
 	# endregion
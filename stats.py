@@ -0,0 +1,61 @@
+# coding=utf-8
+from time import perf_counter_ns
+from typing import Callable, Optional
+
+
+class Stats:
+	# Optional counters handed to a Solver search. Expanding a node means asking for its successors;
+	# each successor is either generated, or pruned because the move falls off the level. A generated
+	# node is then either new or pruned as a duplicate by the visited lookup. The two phases are timed
+	# separately (in ns), and progress(stats) is called every `interval` expansions.
+	clock = staticmethod(perf_counter_ns)
+
+	def __init__(self, progress: Optional[Callable[['Stats'], None]] = None, interval=10000):
+		self.expanded = 0
+		self.generated = 0
+		self.duplicates = 0
+		self.invalid = 0
+		self.frontier = 0
+		self.peak_frontier = 0
+		self.successor_ns = 0
+		self.lookup_ns = 0
+		self.progress = progress
+		self.interval = interval
+
+	@property
+	def branching_factor(self):
+		return self.generated / self.expanded if self.expanded else 0.0
+
+	def expand(self, frontier: int):
+		# called once per expanded node with the frontier size before it was popped
+		self.expanded += 1
+		self.frontier = frontier
+		if frontier > self.peak_frontier:
+			self.peak_frontier = frontier
+		if self.progress is not None and self.expanded % self.interval == 0:
+			self.progress(self)
+
+	def expand_layer(self, size: int):
+		# called once per layer by the searches that expand a whole layer at once
+		previous = self.expanded
+		self.expanded += size
+		self.frontier = size
+		if size > self.peak_frontier:
+			self.peak_frontier = size
+		if self.progress is not None and self.expanded // self.interval > previous // self.interval:
+			self.progress(self)
+
+	def as_dict(self):
+		return {
+			'expanded': self.expanded,
+			'generated': self.generated,
+			'duplicates': self.duplicates,
+			'invalid': self.invalid,
+			'peak_frontier': self.peak_frontier,
+			'branching_factor': round(self.branching_factor, 3),
+			'successor_ms': round(self.successor_ns / 1e6, 3),
+			'lookup_ms': round(self.lookup_ns / 1e6, 3),
+		}
+
+	def __repr__(self):
+		return 'Stats({})'.format(', '.join('{}={}'.format(key, value) for key, value in self.as_dict().items()))
@@ -0,0 +1,72 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+from level import Level, parse_level, stage_path
+from solver import Solver
+from utility import Method
+from visited import BitSet
+
+# the goal is on its own island, the block has 29 states it can't leave
+island = [
+	'ooo ooo ooo ooo --- ooo ooo',
+	'ooo PPP ooo ooo --- ggg ooo',
+	'ooo ooo ooo ooo --- ooo ooo',
+]
+
+optimal_methods = [
+	Method.breadth_first_search,
+	Method.hill_climbing,
+	Method.bidirectional_search,
+	Method.batched_breadth_first_search,
+	Method.iterative_deepening,
+]
+
+
+def replay(level: Level, moves):
+	# the key the moves lead to from the start
+	key = level.start
+	for move in moves:
+		key = dict(level.successors(key))[move]
+	return key
+
+
+@pytest.mark.parametrize('stage', [1, 4, 11, 15, 33])
+def test_optimal_methods_agree(stage):
+	level = Level.load(stage_path(stage), cache=False)
+	lengths = set()
+	for method in optimal_methods:
+		moves = Solver.run(level, method)[0]
+		assert level.is_goal(replay(level, moves))
+		lengths.add(len(moves))
+	assert len(lengths) == 1
+
+
+@pytest.mark.parametrize('method', optimal_methods + [Method.depth_first_search])
+def test_unreachable_goal(method):
+	level = Level(*parse_level(island))
+	assert Solver.run(level, method)[0] is None
+
+
+def test_stage_without_goal_tile():
+	level = Level(*parse_level([line.replace('ggg', 'ooo') for line in island]))
+	for method in optimal_methods:
+		assert Solver.run(level, method)[0] is None
+
+
+def test_iterative_deepening_gives_up_on_unreachable_goal():
+	level = Level(*parse_level(island))
+	assert Solver.iterative_deepening(level, level.start)[0] is None
+
+
+def test_stage_without_start_tile():
+	with pytest.raises(ValueError, match='no start tile'):
+		Level(*parse_level([line.replace('PPP', 'ooo') for line in island]))
+
+
+def test_bit_set():
+	bits = BitSet(100)
+	bits.add(3)
+	bits.update(np.array([5, 8, 9, 64]))
+	assert len(bits) == 5 and 9 in bits and 10 not in bits
+	assert bits.contains(np.array([3, 4, 64, 99])).tolist() == [True, False, True, False]
@@ -20,3 +20,14 @@ class Method:
 	depth_first_search = 0
 	breadth_first_search = 1
 	hill_climbing = 2
+	bidirectional_search = 3
+	iterative_deepening = 4
+	batched_breadth_first_search = 5
+
+
+class Cell:
+	empty = 0
+	floor = 1
+	soft_floor = 2
+	goal = 3
+	bridge = 4
@@ -0,0 +1,55 @@
+# coding=utf-8
+import numpy as np
+
+from level import Level
+
+
+class BitSet:
+	# The ints of range(size) as one bit each in a bytearray, for the dense key space of a Level
+	# (config * masks + mask). `in`, add() and len() take single keys, contains() and update() whole
+	# NumPy arrays through a view of the same bytes.
+	__slots__ = ('bits', 'view', 'count')
+
+	def __init__(self, size: int):
+		self.bits = bytearray((size + 7) >> 3)
+		self.view = np.frombuffer(self.bits, np.uint8)
+		self.count = 0
+
+	def __contains__(self, key: int):
+		return self.bits[key >> 3] >> (key & 7) & 1 == 1
+
+	def add(self, key: int):
+		bit = 1 << (key & 7)
+		if not self.bits[key >> 3] & bit:
+			self.bits[key >> 3] |= bit
+			self.count += 1
+
+	def __len__(self):
+		return self.count
+
+	def contains(self, keys: np.ndarray):
+		return (self.view[keys >> 3] >> (keys & 7).astype(np.uint8)) & 1 == 1
+
+	def update(self, keys: np.ndarray):
+		# keys sorted, without repeats and not in the set yet, as np.unique leaves them once the
+		# known ones are dropped
+		if keys.size:
+			byte = keys >> 3
+			heads = np.flatnonzero(np.r_[True, byte[1:] != byte[:-1]])
+			self.view[byte[heads]] |= np.bitwise_or.reduceat(np.left_shift(1, keys & 7).astype(np.uint8), heads)
+			self.count += keys.size
+
+
+class HashSet(set):
+	# set with BitSet's array methods, for key spaces too large for a bit each
+	def contains(self, keys: np.ndarray):
+		return np.fromiter((key in self for key in keys.tolist()), np.bool_, keys.size)
+
+	def update(self, keys):
+		super().update(keys.tolist() if isinstance(keys, np.ndarray) else keys)
+
+
+def get_visited(level: Level, limit=1 << 31):
+	# a BitSet over the level's keys when there are at most limit of them (limit / 8 bytes), else a HashSet
+	size = level.get_size()
+	return BitSet(size) if size <= limit else HashSet()